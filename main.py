@@ -7,6 +7,7 @@ SRC_ROOT = ROOT / "src"
 if str(SRC_ROOT) not in sys.path:
     sys.path.insert(0, str(SRC_ROOT))
 
+from pdfnotebook.server import DEFAULT_GRACEFUL_TIMEOUT, DEFAULT_THREADS, serve
 from pdfnotebook.webapp import app
 
 if __name__ == "__main__":
@@ -23,4 +24,20 @@ if __name__ == "__main__":
     except Exception:
         print(" * Could not determine LAN IP")
 
-    app.run(host=host, port=port)
+    # Migrate the database once, here, and leave nothing open: a preforking
+    # server forks its workers from this process. Each serving process then
+    # starts its own services and background thread.
+    state = app.extensions["pdfnotebook"]
+    state.prepare()
+    serve(
+        app,
+        host,
+        port,
+        server=os.environ.get("PDFNOTEBOOK_SERVER", "dev"),
+        workers=int(os.environ.get("PDFNOTEBOOK_WORKERS", "0")),
+        threads=int(os.environ.get("PDFNOTEBOOK_THREADS", str(DEFAULT_THREADS))),
+        graceful_timeout=int(
+            os.environ.get("PDFNOTEBOOK_GRACEFUL_TIMEOUT", str(DEFAULT_GRACEFUL_TIMEOUT))
+        ),
+        on_start=state.start,
+    )
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""Stress DatabaseManager with concurrent readers (and an optional writer).
+
+The read cache is off, so every read is a real query. Two workloads:
+
+``summaries``
+    The page list the UI loads: a short indexed query, then one Python
+    object per page. Most of its time is spent holding the GIL, so extra
+    threads add little.
+``aggregate``
+    An aggregate over the document's whole entry history. The time is spent
+    inside SQLite, which releases the GIL while a statement runs, so this
+    is the workload that shows whether reads run in parallel. It can only
+    scale up to the number of CPUs, which the header prints.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+
+HOME = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(HOME / "src"))
+
+from pdfnotebook.db import DatabaseManager  # noqa: E402
+
+
+AGGREGATE_SQL = """
+    SELECT COUNT(*), SUM(LENGTH(user_input) + LENGTH(output)), MAX(created_at)
+    FROM page_entries WHERE doc_id = ?
+"""
+
+
+def read_summaries(db: DatabaseManager, doc_id: str) -> None:
+    db.fetch_page_summaries(doc_id)
+    db.get_page_note(doc_id, 1)
+
+
+def read_aggregate(db: DatabaseManager, doc_id: str) -> None:
+    db.connection.execute(AGGREGATE_SQL, (doc_id,)).fetchone()
+
+
+WORKLOADS = {"summaries": read_summaries, "aggregate": read_aggregate}
+
+
+def reader(
+    db: DatabaseManager, doc_id: str, deadline: float, counts: list, slot: int, read
+) -> None:
+    done = 0
+    while time.perf_counter() < deadline:
+        read(db, doc_id)
+        done += 1
+    counts[slot] = done
+
+
+def writer(db: DatabaseManager, doc_id: str, deadline: float, pages: int) -> None:
+    page = 0
+    while time.perf_counter() < deadline:
+        page = page % pages + 1
+        db.add_page_entry(doc_id, page, "bench", "input", "output", False, False, "")
+
+
+def run(
+    db: DatabaseManager,
+    doc_id: str,
+    threads: int,
+    seconds: float,
+    pages: int,
+    with_writer: bool,
+    read,
+) -> float:
+    deadline = time.perf_counter() + seconds
+    counts = [0] * threads
+    workers = [
+        threading.Thread(target=reader, args=(db, doc_id, deadline, counts, slot, read))
+        for slot in range(threads)
+    ]
+    if with_writer:
+        workers.append(threading.Thread(target=writer, args=(db, doc_id, deadline, pages)))
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return sum(counts) / seconds
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--pages", type=int, default=300)
+    parser.add_argument("--entries", type=int, default=20_000, help="history rows to aggregate")
+    parser.add_argument("--workload", choices=sorted(WORKLOADS), nargs="+", default=sorted(WORKLOADS))
+    parser.add_argument("--seconds", type=float, default=2.0)
+    parser.add_argument("--journal-mode", default="wal")
+    parser.add_argument("--synchronous", default="normal")
+    parser.add_argument("--writer", action="store_true", help="run a concurrent writer thread")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DatabaseManager(
+            Path(tmp) / "bench.db",
+            journal_mode=args.journal_mode,
+            synchronous=args.synchronous,
+            cache_size=0,
+        )
+        doc_id = "bench"
+        db.create_document(doc_id, doc_id, Path("bench.pdf"), args.pages)
+        db.ensure_page_entries(doc_id, args.pages)
+        with db.transaction():
+            db.connection.executemany(
+                """
+                INSERT INTO page_entries (doc_id, page_number, user_input, output, created_at)
+                VALUES (?, ?, 'input text', 'output text', ?)
+                """,
+                (
+                    (doc_id, index % args.pages + 1, f"2024-01-01T00:00:{index % 60:02}")
+                    for index in range(args.entries)
+                ),
+            )
+        print(
+            f"cpus={os.cpu_count()} journal_mode={args.journal_mode} "
+            f"synchronous={args.synchronous} writer={args.writer}"
+        )
+        for workload in args.workload:
+            print(f"\n{workload}")
+            print(f"{'threads':>8} {'reads/s':>10} {'speedup':>8}")
+            base = None
+            for threads in args.threads:
+                rate = run(
+                    db, doc_id, threads, args.seconds, args.pages, args.writer, WORKLOADS[workload]
+                )
+                base = base or rate
+                print(f"{threads:>8} {rate:>10.0f} {rate / base:>7.2f}x")
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
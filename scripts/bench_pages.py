@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""Compare page listing latency for the per-page and aggregated count queries.
+
+The last column times the packed status map behind progress and resume: a
+cold load of the blob plus progress counts and the next incomplete page.
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+
+HOME = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(HOME / "src"))
+
+from pdfnotebook.db import DatabaseManager  # noqa: E402
+
+
+def populate(db: DatabaseManager, doc_id: str, pages: int, entries_per_page: int) -> None:
+    """Create a document with ``pages`` rows and a few history entries per page."""
+    db.create_document(doc_id, doc_id, Path(f"{doc_id}.pdf"), pages)
+    db.ensure_page_entries(doc_id, pages)
+    rows = [
+        (doc_id, page, "bench", "input", "output", 0, 0, "", None, "2024-01-01T00:00:00")
+        for page in range(1, pages + 1)
+        for _ in range(entries_per_page)
+    ]
+    db.connection.executemany(
+        """
+        INSERT INTO page_entries
+            (doc_id, page_number, author, user_input, output, complete, ignored, tags, attachment_path, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        rows,
+    )
+    db.connection.commit()
+
+
+def per_page_listing(db: DatabaseManager, doc_id: str) -> int:
+    """The old listing: one COUNT query per page note."""
+    notes = db.fetch_page_notes(doc_id)
+    return sum(db.get_entry_count(doc_id, note.page_number) for note in notes)
+
+
+def aggregated_listing(db: DatabaseManager, doc_id: str) -> int:
+    db.cache.clear()
+    return sum(summary.entry_count for summary in db.fetch_page_summaries(doc_id))
+
+
+def status_queries(db: DatabaseManager, doc_id: str) -> None:
+    db.cache.clear()
+    status = db.get_page_status(doc_id)
+    status.counts()
+    status.first_pending()
+
+
+def best_of(func, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, nargs="+", default=[100, 500, 1500, 5000])
+    parser.add_argument("--entries-per-page", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DatabaseManager(Path(tmp) / "bench.db")
+        print(
+            f"{'pages':>8} {'per-page ms':>12} {'aggregated ms':>14} {'speedup':>8}"
+            f" {'status us':>10}"
+        )
+        for pages in args.pages:
+            doc_id = f"bench-{pages}"
+            populate(db, doc_id, pages, args.entries_per_page)
+            assert per_page_listing(db, doc_id) == aggregated_listing(db, doc_id)
+            slow = best_of(lambda: per_page_listing(db, doc_id), args.repeat)
+            fast = best_of(lambda: aggregated_listing(db, doc_id), args.repeat)
+            status = best_of(lambda: status_queries(db, doc_id), args.repeat)
+            print(
+                f"{pages:>8} {slow * 1000:>12.2f} {fast * 1000:>14.2f} {slow / fast:>7.1f}x"
+                f" {status * 1e6:>10.1f}"
+            )
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
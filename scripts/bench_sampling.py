@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""Compare ORDER BY RANDOM() with index probing for random entry snapshots.
+
+Entries are spread over several documents so each document's ids interleave
+with the others', as they do when several PDFs are annotated side by side.
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+
+HOME = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(HOME / "src"))
+
+from pdfnotebook.db import DatabaseManager  # noqa: E402
+
+
+def populate(db: DatabaseManager, entries: int, documents: int) -> None:
+    for index in range(documents):
+        db.create_document(f"doc-{index}", f"doc-{index}", Path(f"doc-{index}.pdf"), 1)
+    db.connection.executemany(
+        """
+        INSERT INTO page_entries (doc_id, page_number, user_input, output, created_at)
+        VALUES (?, 1, ?, '', '2024-01-01T00:00:00')
+        """,
+        ((f"doc-{n % documents}", "x" * 200) for n in range(entries)),
+    )
+    db.connection.commit()
+
+
+def order_by_random(db: DatabaseManager, doc_id: str) -> None:
+    db.connection.execute(
+        "SELECT * FROM page_entries WHERE doc_id = ? ORDER BY RANDOM() LIMIT 1", (doc_id,)
+    ).fetchone()
+
+
+def mean_ms(func, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--entries", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--documents", type=int, default=3)
+    parser.add_argument("--batch", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'entries':>8} {'random() ms':>12} {'probe ms':>9} {f'batch {args.batch} ms':>12}")
+    for entries in args.entries:
+        with tempfile.TemporaryDirectory() as tmp:
+            db = DatabaseManager(Path(tmp) / "bench.db")
+            populate(db, entries, args.documents)
+            slow = mean_ms(lambda: order_by_random(db, "doc-0"), args.repeat)
+            fast = mean_ms(lambda: db.get_random_page_entry("doc-0"), args.repeat)
+            batch = mean_ms(lambda: db.sample_page_entries("doc-0", args.batch), args.repeat)
+            print(f"{entries:>8} {slow:>12.3f} {fast:>9.3f} {batch:>12.3f}")
+            db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""Build a synthetic image-heavy PDF and measure page splitting throughput.
+
+Compares the original one-writer-per-page splitter with split_pdf for each
+requested worker count, and checks that every run produces identical files.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from PyPDF2 import PageObject, PdfReader, PdfWriter
+from PyPDF2.generic import (
+    DecodedStreamObject,
+    DictionaryObject,
+    NameObject,
+    NumberObject,
+)
+
+
+HOME = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(HOME / "src"))
+
+from pdfnotebook.pdf_processor import split_pdf  # noqa: E402
+
+
+def build_pdf(path: Path, pages: int, image_bytes: int) -> None:
+    """Write a PDF whose pages share one resource dictionary holding every image.
+
+    This mirrors scanned books where the page tree carries a single /Resources
+    entry and each page draws only its own image.
+    """
+    writer = PdfWriter()
+    xobjects = DictionaryObject()
+    for index in range(pages):
+        side = max(1, int((image_bytes // 3) ** 0.5))
+        image = DecodedStreamObject()
+        image.set_data(os.urandom(side * side * 3))
+        image.update(
+            {
+                NameObject("/Type"): NameObject("/XObject"),
+                NameObject("/Subtype"): NameObject("/Image"),
+                NameObject("/Width"): NumberObject(side),
+                NameObject("/Height"): NumberObject(side),
+                NameObject("/ColorSpace"): NameObject("/DeviceRGB"),
+                NameObject("/BitsPerComponent"): NumberObject(8),
+            }
+        )
+        xobjects[NameObject(f"/Im{index}")] = writer._add_object(image)
+    resources = writer._add_object(
+        DictionaryObject({NameObject("/XObject"): xobjects})
+    )
+    for index in range(pages):
+        page = writer.add_page(PageObject.create_blank_page(None, 612, 792))
+        content = DecodedStreamObject()
+        content.set_data(f"q 612 0 0 792 0 0 cm /Im{index} Do Q".encode())
+        page[NameObject("/Contents")] = writer._add_object(content)
+        page[NameObject("/Resources")] = resources
+    with path.open("wb") as handle:
+        writer.write(handle)
+
+
+def naive_split(source: Path, destination: Path) -> int:
+    """The original splitter: one writer per page with every shared resource."""
+    destination.mkdir(parents=True, exist_ok=True)
+    written = 0
+    for index, page in enumerate(PdfReader(source).pages):
+        writer = PdfWriter()
+        writer.add_page(page)
+        with (destination / f"page_{index + 1:03}.pdf").open("wb") as handle:
+            writer.write(handle)
+            written += handle.tell()
+    return written
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--image-kb", type=int, default=24)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--skip-naive", action="store_true")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = Path(tmp) / "synthetic.pdf"
+        build_pdf(source, args.pages, args.image_kb * 1024)
+        print(f"source: {args.pages} pages, {source.stat().st_size / 1e6:.1f} MB")
+
+        if not args.skip_naive:
+            start = time.perf_counter()
+            written = naive_split(source, Path(tmp) / "naive")
+            elapsed = time.perf_counter() - start
+            print(
+                f"{'naive':>10}: {args.pages / elapsed:8.1f} pages/s "
+                f"{written / 1e6:10.1f} MB written"
+            )
+
+        baseline = None
+        for workers in args.workers:
+            result = split_pdf(source, Path(tmp) / f"split-{workers}", workers)
+            contents = [path.read_bytes() for path in result.page_paths]
+            if baseline is None:
+                baseline = contents
+            identical = "identical" if contents == baseline else "MISMATCH"
+            print(
+                f"{f'{workers} worker':>10}: {result.pages_per_second:8.1f} pages/s "
+                f"{result.bytes_written / 1e6:10.1f} MB written  {identical}"
+            )
+
+
+if __name__ == "__main__":
+    main()
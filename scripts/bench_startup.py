@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""Time importing the web app, creating it, and its first request.
+
+Each sample runs in a fresh interpreter so nothing is cached between runs.
+The first request opens the database: "cold" starts from an empty data
+folder and runs every migration, "warm" reopens an up-to-date database and
+only checks its schema version.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+
+HOME = Path(__file__).resolve().parents[1]
+
+PROBE = """
+import sys, time, json
+sys.path.insert(0, {src!r})
+start = time.perf_counter()
+from pdfnotebook.webapp import create_app
+imported = time.perf_counter()
+app = create_app({{"DATA_ROOT": {data_root!r}}})
+created = time.perf_counter()
+assert app.test_client().get("/api/documents").status_code == 200
+served = time.perf_counter()
+print(json.dumps({{
+    "import": imported - start,
+    "create_app": created - imported,
+    "first request": served - created,
+}}))
+"""
+
+
+def sample(data_root: Path) -> dict:
+    code = PROBE.format(src=str(HOME / "src"), data_root=str(data_root))
+    output = subprocess.run(
+        [sys.executable, "-c", code], check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    runs = {"cold": [], "warm": []}
+    for _ in range(args.repeat):
+        with tempfile.TemporaryDirectory() as tmp:
+            runs["cold"].append(sample(Path(tmp)))
+            runs["warm"].append(sample(Path(tmp)))
+
+    print(f"{'start':>6} {'import ms':>10} {'create_app ms':>14} {'first request ms':>17}")
+    for label, samples in runs.items():
+        medians = {
+            key: statistics.median(run[key] for run in samples) * 1000 for key in samples[0]
+        }
+        print(
+            f"{label:>6} {medians['import']:>10.1f} {medians['create_app']:>14.2f}"
+            f" {medians['first request']:>17.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""Fail if a DatabaseManager's read cache misses writes made through another one.
+
+Two managers open the same database, as two gunicorn workers (or a worker
+and a command-line script) do. Manager A warms its cache, manager B writes,
+and A must then read the new state instead of its cached copy: page flags,
+page summaries, the resume position and, last, a tombstone. The exit status
+is 1 when any check fails.
+"""
+from __future__ import annotations
+
+import sys
+import tempfile
+from pathlib import Path
+from typing import Callable, List, Tuple
+
+
+HOME = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(HOME / "src"))
+
+from pdfnotebook.db import DatabaseManager  # noqa: E402
+
+DOC_ID = "doc-1"
+PAGES = 5
+
+Check = Tuple[str, Callable[[DatabaseManager], object], Callable[[DatabaseManager], None]]
+
+# (label, read through A's cache, write through B)
+CHECKS: List[Check] = [
+    (
+        "get_page_status",
+        lambda db: db.get_page_status(DOC_ID).encode(),
+        lambda db: db.set_page_skipped(DOC_ID, 2, True),
+    ),
+    (
+        "fetch_page_summaries",
+        lambda db: [summary.ignored for summary in db.fetch_page_summaries(DOC_ID)],
+        lambda db: db.set_page_ignored(DOC_ID, 3, True),
+    ),
+    (
+        "first_pending",
+        lambda db: db.get_page_status(DOC_ID).first_pending(),
+        lambda db: db.upsert_page_note(DOC_ID, 1, "check", "", "", True, ""),
+    ),
+    (
+        "get_document after delete",
+        lambda db: db.get_document(DOC_ID) is not None,
+        lambda db: db.mark_document_deleted(DOC_ID),
+    ),
+]
+
+
+def main() -> None:
+    failures = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "coherence.db"
+        writer = DatabaseManager(path)
+        writer.create_document(DOC_ID, DOC_ID, Path(f"{DOC_ID}.pdf"), PAGES)
+        writer.ensure_page_entries(DOC_ID, PAGES)
+        reader = DatabaseManager(path)
+        for label, read, write in CHECKS:
+            before = read(reader)
+            # A second read must come from the cache for the check to mean anything.
+            read(reader)
+            write(writer)
+            after = read(reader)
+            expected = read(DatabaseManager(path, cache_size=0))
+            stale = after != expected
+            failures += stale
+            print(f"{'FAIL' if stale else 'ok':>4}  {label}: {before!r} -> {after!r}")
+        reader.close()
+        writer.close()
+    print(f"{failures} of {len(CHECKS)} reads served stale data")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
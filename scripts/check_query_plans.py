@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""Fail if any hot DatabaseManager query plans a full table scan.
+
+Each hot method runs against a small populated database with the read cache
+off. Every SELECT it issues is captured through SQLite's trace hook and
+passed to EXPLAIN QUERY PLAN. A plain ``SCAN <table>`` step fails the check,
+with or without a covering index. So does a temporary B-tree for ORDER BY,
+unless the query is listed in SORTS_ALLOWED. Scans of FTS5 tables and of
+subquery results that SQLite builds itself are allowed. The exit status is 1
+when anything fails, so this can guard schema and query changes.
+"""
+from __future__ import annotations
+
+import argparse
+import re
+import sys
+import tempfile
+from pathlib import Path
+from typing import Callable, List, Tuple
+
+
+HOME = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(HOME / "src"))
+
+from pdfnotebook.db import DatabaseManager  # noqa: E402
+
+SCAN = re.compile(r"^SCAN (?!CONSTANT ROW)(\w+)")
+SORT = "USE TEMP B-TREE FOR ORDER BY"
+BUILT = re.compile(r"^(?:MATERIALIZE|CO-ROUTINE) (\w+)")
+
+# These sort only the rows they matched: by an aggregate, by relevance, or
+# merging the index ranges of several job states.
+SORTS_ALLOWED = {"tag_counts", "search", "list_unfinished_jobs"}
+
+HOT_QUERIES: List[Tuple[str, Callable[[DatabaseManager], object]]] = [
+    ("get_document", lambda db: db.get_document("doc-1")),
+    ("document_is_live", lambda db: db.document_is_live("doc-1")),
+    ("fetch_page_summaries", lambda db: db.fetch_page_summaries("doc-1")),
+    ("fetch_page_summaries window", lambda db: db.fetch_page_summaries("doc-1", 20, 20)),
+    ("get_page_note", lambda db: db.get_page_note("doc-1", 3)),
+    ("get_entry_count", lambda db: db.get_entry_count("doc-1", 3)),
+    ("get_page_status", lambda db: db.get_page_status("doc-1")),
+    ("get_latest_page_entry", lambda db: db.get_latest_page_entry("doc-1")),
+    ("get_latest_general_entry", lambda db: db.get_latest_general_entry("doc-1")),
+    ("list_general_entries", lambda db: db.list_general_entries("doc-1")),
+    ("sample_page_entries", lambda db: db.sample_page_entries("doc-1", 5)),
+    ("pages_with_tag", lambda db: db.pages_with_tag("doc-1", "todo")),
+    ("tag_counts", lambda db: db.tag_counts("doc-1")),
+    ("search", lambda db: db.search("alpha", doc_id="doc-1")),
+    ("export_watermark", lambda db: db.export_watermark()),
+    ("iter_export_rows", lambda db: list(db.iter_export_rows("doc-1", since=0))),
+    ("get_job", lambda db: db.get_job("job-1")),
+    ("list_unfinished_jobs", lambda db: db.list_unfinished_jobs()),
+    ("list_deleted_documents", lambda db: db.list_deleted_documents()),
+    ("storage_key_in_use", lambda db: db.storage_key_in_use("doc-1")),
+]
+
+
+def populate(db: DatabaseManager, documents: int, pages: int) -> None:
+    for index in range(documents):
+        doc_id = f"doc-{index}"
+        db.create_document(doc_id, doc_id, Path(f"{doc_id}.pdf"), pages)
+        db.ensure_page_entries(doc_id, pages)
+        for page in range(1, pages + 1):
+            db.add_page_entry(doc_id, page, "bench", "alpha beta", "gamma", False, False, "todo")
+        db.add_general_entry(doc_id, "bench", "alpha", "delta", "idea")
+        db.create_job(f"job-{index}", doc_id, doc_id, Path(f"{doc_id}.pdf"))
+        # Like a real database, most jobs have finished.
+        if index:
+            db.update_job(f"job-{index}", status="done")
+
+
+def full_scans(db: DatabaseManager, statement: str, sorts_allowed: bool) -> List[str]:
+    built = set()
+    scans = []
+    for row in db.connection.execute(f"EXPLAIN QUERY PLAN {statement}"):
+        detail = row["detail"]
+        match = BUILT.match(detail)
+        if match:
+            built.add(match.group(1))
+        match = SCAN.match(detail)
+        if match and match.group(1) not in built and "VIRTUAL TABLE" not in detail:
+            scans.append(detail)
+        elif detail == SORT and not sorts_allowed:
+            scans.append(detail)
+    return scans
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--documents", type=int, default=3)
+    parser.add_argument("--pages", type=int, default=50)
+    parser.add_argument("--verbose", action="store_true", help="print every plan")
+    args = parser.parse_args()
+
+    failures = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DatabaseManager(Path(tmp) / "plans.db", cache_size=0)
+        populate(db, args.documents, args.pages)
+        for label, call in HOT_QUERIES:
+            statements: List[str] = []
+            db.connection.set_trace_callback(statements.append)
+            call(db)
+            db.connection.set_trace_callback(None)
+            selects = [
+                sql for sql in statements if sql.lstrip().upper().startswith(("SELECT", "WITH"))
+            ]
+            sorts_allowed = label in SORTS_ALLOWED
+            scans = [scan for sql in selects for scan in full_scans(db, sql, sorts_allowed)]
+            failures += bool(scans)
+            print(f"{'FAIL' if scans else 'ok':>4}  {label}")
+            for scan in scans:
+                print(f"        {scan}")
+            if args.verbose:
+                for sql in selects:
+                    for row in db.connection.execute(f"EXPLAIN QUERY PLAN {sql}"):
+                        print(f"        | {row['detail']}")
+        db.close()
+    print(f"{failures} of {len(HOT_QUERIES)} hot queries scan or sort a table")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
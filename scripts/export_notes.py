@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""Export a document's notes, entry history and general entries from the command line.
+
+The same stream as ``/api/export/<doc_id>``. The ``until`` watermark is
+printed to stderr; pass it back as ``--since`` for the next incremental
+export.
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+
+
+HOME = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(HOME / "src"))
+
+from pdfnotebook.db import DatabaseManager  # noqa: E402
+from pdfnotebook.export import (  # noqa: E402
+    FORMATS,
+    export_stream,
+    export_window,
+    parse_watermark,
+)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("doc_id")
+    parser.add_argument("--db", type=Path, default=HOME / "src" / "data" / "notes.db")
+    parser.add_argument("--format", choices=list(FORMATS), default="jsonl")
+    parser.add_argument("--since", help="only records written after this earlier 'until' value")
+    parser.add_argument("--gzip", action="store_true", help="gzip the output")
+    parser.add_argument("-o", "--output", type=Path, help="output file (default stdout)")
+    args = parser.parse_args()
+
+    if not args.db.exists():
+        parser.error(f"no database at {args.db}")
+    try:
+        since = parse_watermark(args.since) if args.since else None
+    except ValueError:
+        parser.error("--since must be the 'until' value printed by an earlier export")
+
+    db = DatabaseManager(args.db)
+    if not db.get_document(args.doc_id):
+        parser.error(f"unknown document {args.doc_id}")
+    until = export_window(db, since)
+    chunks = export_stream(
+        db, args.doc_id, args.format, since=since, until=until, compress=args.gzip
+    )
+    out = args.output.open("wb") if args.output else sys.stdout.buffer
+    try:
+        for chunk in chunks:
+            out.write(chunk)
+    finally:
+        if args.output:
+            out.close()
+    db.close()
+    print(f"until: {until}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,3 @@
 """Core package for Pdf Notebook Assistant."""
 
-__all__ = ["db", "pdf_processor", "webapp"]
+__all__ = ["blobs", "db", "export", "forking", "jobs", "page_status", "pdf_processor", "server", "thumbnails", "uploads", "webapp"]
@@ -0,0 +1,125 @@
+"""Content-addressed storage for uploaded PDFs.
+
+Each distinct PDF is stored once, at ``root/<sha[:2]>/<sha>.pdf``, and its
+pages are split into ``split_root/<sha>``. Every document made from an
+upload holds one reference to the blob in the ``blobs`` table. Uploading a
+file that is already stored therefore costs only its hashing: the new copy is
+discarded and the new document reuses the stored file and its splits. The
+files are removed when the last document referencing them is deleted.
+
+Where the platform allows it, ``split_root/<doc_id>`` is a symlink to the
+folder of the document's blob, so a page can be found from its URL without
+looking the document up. The link goes when the document is deleted.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import uuid
+from pathlib import Path
+from typing import BinaryIO, Optional, Tuple
+
+from .db import DatabaseManager
+
+BLOCK_SIZE = 1024 * 1024
+
+
+class BlobStore:
+    def __init__(self, db: DatabaseManager, root: Path, split_root: Path) -> None:
+        self.db = db
+        self.root = root
+        self.split_root = split_root
+        self.incoming_root = root / "incoming"
+        self.trash_root = root / "trash"
+
+    def path_for(self, sha256: str) -> Path:
+        return self.root / sha256[:2] / f"{sha256}.pdf"
+
+    def split_dir(self, sha256: str) -> Path:
+        return self.split_root / sha256
+
+    def link_document(self, doc_id: str, sha256: str) -> None:
+        """Point ``split_root/<doc_id>`` at the blob's split folder, if symlinks are allowed."""
+        try:
+            os.symlink(sha256, self.split_root / doc_id, target_is_directory=True)
+        except FileExistsError:
+            pass
+        except (OSError, NotImplementedError):
+            # Windows without the symlink privilege: pages are looked up instead.
+            pass
+
+    def unlink_document(self, doc_id: str) -> None:
+        """Make ``split_root/<doc_id>`` disappear at once.
+
+        A link is removed. A folder of the document's own, from before the
+        blob store, is moved to ``trash_root/<doc_id>`` for the reaper.
+        """
+        entry = self.split_root / doc_id
+        if entry.is_symlink():
+            entry.unlink(missing_ok=True)
+        elif entry.is_dir():
+            self.trash_root.mkdir(parents=True, exist_ok=True)
+            try:
+                os.replace(entry, self.trash_root / doc_id)
+            except OSError:
+                pass
+
+    def incoming_path(self) -> Path:
+        """A fresh temporary path for a file that is about to be stored."""
+        self.incoming_root.mkdir(parents=True, exist_ok=True)
+        return self.incoming_root / f"{uuid.uuid4().hex}.tmp"
+
+    def receive(self, stream: BinaryIO) -> Tuple[Path, str]:
+        """Copy ``stream`` to an incoming file, hashing it on the way; return both."""
+        incoming = self.incoming_path()
+        digest = hashlib.sha256()
+        try:
+            with incoming.open("wb") as handle:
+                for block in iter(lambda: stream.read(BLOCK_SIZE), b""):
+                    handle.write(block)
+                    digest.update(block)
+        except BaseException:
+            incoming.unlink(missing_ok=True)
+            raise
+        return incoming, digest.hexdigest()
+
+    def store(self, incoming: Path, sha256: str) -> Tuple[Path, bool]:
+        """Take a reference to the blob for ``incoming`` and return ``(path, reused)``.
+
+        ``incoming`` is consumed either way: moved into place for new content,
+        deleted when the content is already stored.
+        """
+        path = self.path_for(sha256)
+        size = incoming.stat().st_size
+        # The reference and the file move happen under the write lock, so a
+        # concurrent release of the same blob cannot delete it in between.
+        with self.db.transaction():
+            reused = self.db.acquire_blob(sha256, size) and path.exists()
+            if reused:
+                incoming.unlink(missing_ok=True)
+            else:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(incoming, path)
+        return path, reused
+
+    def release(self, sha256: str) -> Optional[Path]:
+        """Drop one reference; return the trash folder to delete if it was the last.
+
+        The file and its splits are only moved into the folder, which is
+        cheap. The caller deletes it once the enclosing transaction has
+        committed, so the write lock is not held while a large split folder
+        is removed. A folder left behind by a crash is removed by
+        ``DocumentReaper.sweep_orphans``.
+        """
+        trash = self.trash_root / uuid.uuid4().hex
+        with self.db.transaction():
+            if self.db.release_blob(sha256):
+                return None
+            # Move the files aside while the lock is held so a concurrent
+            # upload of the same content stores a fresh copy instead of
+            # reusing one that is about to go.
+            trash.mkdir(parents=True, exist_ok=True)
+            for path in (self.path_for(sha256), self.split_dir(sha256)):
+                if path.exists():
+                    os.replace(path, trash / path.name)
+        return trash
@@ -1,11 +1,23 @@
 """A persistence layer that tracks PDF documents, pages, and entry history."""
 from __future__ import annotations
 
+from bisect import bisect_right
+from collections import OrderedDict
+from contextlib import contextmanager
 from dataclasses import dataclass
 from datetime import datetime
 from pathlib import Path
-from typing import List, Optional
+from typing import Any, Dict, Hashable, Iterable, Iterator, List, Optional, Set, Tuple
+import random
 import sqlite3
+import threading
+import time
+
+from .forking import process_id, register_after_fork
+from .page_status import COMPLETE, IGNORED, SKIPPED, PageStatusMap
+
+JOURNAL_MODES = {"delete", "truncate", "persist", "memory", "wal", "off"}
+SYNCHRONOUS_LEVELS = {"off", "normal", "full", "extra"}
 
 
 @dataclass
@@ -18,6 +30,11 @@ class Document:
     page_count: int
     created_at: datetime
     updated_at: datetime
+    # SHA-256 of the source PDF in the blob store; None for documents
+    # uploaded before content addressing, whose files are keyed by doc_id.
+    content_hash: Optional[str] = None
+    # Set when the document is deleted; its rows and files are removed later.
+    deleted_at: Optional[datetime] = None
 
 
 @dataclass
@@ -50,9 +67,21 @@ class PageEntry:
     complete: bool
     ignored: bool
     tags: str
+    attachment_path: Optional[str]
     created_at: datetime
 
 
+@dataclass
+class PageSummary:
+    """Per-page status flags plus the number of saved entries."""
+
+    page_number: int
+    complete: bool
+    ignored: bool
+    skipped: bool
+    entry_count: int
+
+
 @dataclass
 class GeneralEntry:
     doc_id: str
@@ -60,21 +89,413 @@ class GeneralEntry:
     user_input: str
     output: str
     tags: str
+    attachment_path: Optional[str]
+    created_at: datetime
+
+
+@dataclass
+class Job:
+    """A background ingestion job for an uploaded PDF."""
+
+    job_id: str
+    doc_id: str
+    name: str
+    source_path: str
+    status: str
+    pages_done: int
+    page_count: int
+    error: Optional[str]
+    created_at: datetime
+    updated_at: datetime
+    content_hash: Optional[str] = None
+    # forking.process_id() of the process running the job; another process
+    # adopts the job only once that one has exited.
+    worker: Optional[str] = None
+
+
+@dataclass
+class Blob:
+    """A stored PDF shared by every document uploaded with the same content."""
+
+    sha256: str
+    size: int
+    ref_count: int
+    page_count: Optional[int]
+    created_at: datetime
+
+
+@dataclass
+class Upload:
+    """A chunked upload in progress; ``received`` bytes are safely on disk."""
+
+    upload_id: str
+    name: str
+    size: int
+    received: int
+    sha256: Optional[str]
     created_at: datetime
+    updated_at: datetime
+
+
+@dataclass
+class SearchHit:
+    """A ranked full-text match; text fields carry highlight markers."""
+
+    kind: str
+    id: int
+    doc_id: str
+    page_number: Optional[int]
+    author: str
+    user_input: str
+    output: str
+    tags: str
+    rank: float
+    timestamp: datetime
+
+
+JOB_QUEUED = "queued"
+JOB_SPLITTING = "splitting"
+JOB_INDEXING = "indexing"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+UNFINISHED_JOB_STATES = (JOB_QUEUED, JOB_SPLITTING, JOB_INDEXING)
+
+# Random id probes allowed per requested sample before falling back to
+# drawing from the document's full id list.
+SAMPLE_PROBES = 32
+
+# Matched terms in SearchHit text are wrapped in these control characters,
+# which cannot occur in form input, so callers can escape then mark up.
+HIGHLIGHT_START = "\x02"
+HIGHLIGHT_END = "\x03"
+SEARCH_COLUMNS = ("author", "user_input", "output", "tags")
+# Source table -> (hit kind, FTS table, timestamp column, has page_number).
+SEARCH_TABLES = {
+    "page_notes": ("note", "page_notes_fts", "updated_at", True),
+    "page_entries": ("entry", "page_entries_fts", "created_at", True),
+    "general_entries": ("general", "general_entries_fts", "created_at", False),
+}
+SEARCH_KINDS = tuple(kind for kind, _, _, _ in SEARCH_TABLES.values())
+
+# Flat record layout shared by every exported note and entry; fields a kind
+# does not have are None.
+EXPORT_FIELDS = (
+    "kind", "id", "doc_id", "page_number", "author", "user_input", "output", "tags",
+    "complete", "ignored", "skipped", "attachment_path", "timestamp", "seq",
+)
+# Record kind -> (table, selected columns, timestamp column). Exports are
+# filtered and ordered by the tables' ``seq`` column (see _migrate_change_seq).
+EXPORT_SOURCES = {
+    "note": (
+        "page_notes",
+        "id, doc_id, page_number, author, user_input, output, tags, "
+        "complete, ignored, skipped, attachment_path",
+        "updated_at",
+    ),
+    "entry": (
+        "page_entries",
+        "id, doc_id, page_number, author, user_input, output, tags, "
+        "complete, ignored, NULL AS skipped, attachment_path",
+        "created_at",
+    ),
+    "general": (
+        "general_entries",
+        "id, doc_id, NULL AS page_number, author, user_input, output, tags, "
+        "NULL AS complete, NULL AS ignored, NULL AS skipped, attachment_path",
+        "created_at",
+    ),
+}
+
+# Tables holding a document's rows -> key selecting a batch of them, in the
+# order purge_document_rows empties them (tag index before the entries).
+PURGE_TABLES = (
+    ("entry_tags", "kind, row_id, tag_id"),
+    ("page_entries", "id"),
+    ("general_entries", "id"),
+    ("page_notes", "id"),
+    ("page_status", "doc_id"),
+)
+
+
+def parse_tags(text: Optional[str]) -> List[str]:
+    """Split a comma-separated tag string into unique, lower-cased names."""
+    names: List[str] = []
+    for part in (text or "").split(","):
+        name = " ".join(part.split()).lower()
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+class ReadCache:
+    """A small thread-safe LRU cache whose entries also expire after ``ttl`` seconds.
+
+    Readers take a ``generation`` before querying and pass it to ``put``; any
+    invalidation in between bumps the generation and the stale result is
+    dropped instead of cached.
+    """
+
+    def __init__(self, maxsize: int = 256, ttl: float = 30.0) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize > 0 and self.ttl > 0
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        """Return ``(True, value)`` on a fresh hit, ``(False, None)`` otherwise."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, key: Hashable, value: Any, generation: int) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, keys: Iterable[Hashable]) -> None:
+        with self._lock:
+            self._generation += 1
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
 
 
 class DatabaseManager:
     """Helper around SQLite that keeps documents, pages, and entries synchronized."""
 
-    def __init__(self, db_path: Path) -> None:
+    def __init__(
+        self,
+        db_path: Path,
+        journal_mode: str = "wal",
+        synchronous: str = "normal",
+        busy_timeout: int = 5000,
+        cache_size: int = 256,
+        cache_ttl: float = 30.0,
+    ) -> None:
+        journal_mode = journal_mode.lower()
+        synchronous = synchronous.lower()
+        if journal_mode not in JOURNAL_MODES:
+            raise ValueError(f"Unsupported journal mode: {journal_mode!r}")
+        if synchronous not in SYNCHRONOUS_LEVELS:
+            raise ValueError(f"Unsupported synchronous level: {synchronous!r}")
         self.db_path = db_path
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
-        self.connection = sqlite3.connect(str(self.db_path), check_same_thread=False)
-        self.connection.row_factory = sqlite3.Row
-        self.connection.execute("PRAGMA foreign_keys = ON")
-        self._create_tables()
+        self.journal_mode = journal_mode
+        self.synchronous = synchronous
+        self.busy_timeout = int(busy_timeout)
+        self._local = threading.local()
+        self._connections: Dict[threading.Thread, sqlite3.Connection] = {}
+        self._connections_lock = threading.Lock()
+        # Document rows, page-status lists and status maps, keyed
+        # ("document"|"pages"|"status", doc_id).
+        self.cache = ReadCache(cache_size, cache_ttl)
+        # Connections inherited across fork(); see _after_fork.
+        self._inherited: List[sqlite3.Connection] = []
+        self._migrate()
+        register_after_fork(self._after_fork)
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """Return the calling thread's connection, opening it on first use."""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._connect()
+            self._local.connection = connection
+        return connection
+
+    def _connect(self) -> sqlite3.Connection:
+        # Each connection belongs to one thread; check_same_thread is disabled
+        # only so close() and the reaper can shut it down from elsewhere.
+        connection = sqlite3.connect(
+            str(self.db_path),
+            timeout=self.busy_timeout / 1000,
+            check_same_thread=False,
+        )
+        connection.row_factory = sqlite3.Row
+        connection.execute(f"PRAGMA busy_timeout = {self.busy_timeout}")
+        connection.execute(f"PRAGMA journal_mode = {self.journal_mode}")
+        connection.execute(f"PRAGMA synchronous = {self.synchronous}")
+        connection.execute("PRAGMA foreign_keys = ON")
+        with self._connections_lock:
+            self._reap_connections()
+            self._connections[threading.current_thread()] = connection
+        return connection
+
+    def _reap_connections(self) -> None:
+        """Close connections whose owning thread has exited."""
+        for thread in [thread for thread in self._connections if not thread.is_alive()]:
+            self._connections.pop(thread).close()
+
+    def _after_fork(self) -> None:
+        """Give a forked child its own connections, locks and read cache.
+
+        SQLite handles must not be used across fork(). Closing them would be
+        just as unsafe, since the last close of a WAL database checkpoints
+        and removes files the parent is still using, so the child only keeps
+        them referenced and opens new connections on demand.
+        """
+        self._inherited.extend(self._connections.values())
+        self._connections = {}
+        self._connections_lock = threading.Lock()
+        self._local = threading.local()
+        self.cache = ReadCache(self.cache.maxsize, self.cache.ttl)
+
+    def _check_external_writes(self) -> None:
+        """Clear the read cache if another connection committed since this thread last looked.
+
+        Writes made by other processes sharing the database (sibling server
+        workers, command-line scripts) never reach this manager's
+        invalidation calls, and a worker cannot tell whether it has siblings,
+        so every cached read checks. ``PRAGMA data_version`` changes whenever
+        another connection commits, so each check costs one pragma. A
+        thread's first check clears the cache because it has nothing to
+        compare against yet.
+        """
+        version = self.connection.execute("PRAGMA data_version").fetchone()[0]
+        if version != getattr(self._local, "data_version", None):
+            self.cache.clear()
+            self._local.data_version = version
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Group several writes into a single commit.
+
+        Methods called inside the block skip their own commits; the outermost
+        block commits on success and rolls back if an exception escapes or
+        the commit itself fails.
+        Blocks nest, so helpers can open one without checking for a caller's.
+        """
+        connection = self.connection
+        depth = getattr(self._local, "transaction_depth", 0)
+        if depth == 0:
+            connection.execute("BEGIN IMMEDIATE")
+            self._local.stale_keys = set()
+        self._local.transaction_depth = depth + 1
+        try:
+            yield connection
+        except BaseException:
+            self._local.transaction_depth = depth
+            if depth == 0:
+                connection.rollback()
+                self.cache.invalidate(self._local.stale_keys)
+            raise
+        self._local.transaction_depth = depth
+        if depth == 0:
+            try:
+                connection.commit()
+            except BaseException:
+                # A failed COMMIT (busy, disk full) leaves the transaction
+                # open, and the next BEGIN on this connection would fail.
+                connection.rollback()
+                raise
+            finally:
+                self.cache.invalidate(self._local.stale_keys)
 
-    def _create_tables(self) -> None:
+    def _commit(self) -> None:
+        """Commit unless the calling thread is inside ``transaction()``."""
+        if not getattr(self._local, "transaction_depth", 0):
+            self.connection.commit()
+
+    def _invalidate(self, doc_id: str, document: bool = True, pages: bool = True) -> None:
+        """Drop cached reads for ``doc_id`` once the current write is committed."""
+        keys: Set[Tuple[str, str]] = set()
+        if document:
+            keys.add(("document", doc_id))
+        if pages:
+            keys.add(("pages", doc_id))
+            keys.add(("status", doc_id))
+        if getattr(self._local, "transaction_depth", 0):
+            self._local.stale_keys.update(keys)
+        else:
+            self.cache.invalidate(keys)
+
+    def cache_stats(self) -> Dict[str, int]:
+        """Hit and miss counters for the document/page-status read cache."""
+        return self.cache.stats()
+
+    # Schema changes, applied in order. PRAGMA user_version records how many
+    # have run, so an up-to-date database skips straight past them. Databases
+    # from before versioning start at 0; each step only adds what is missing,
+    # so they can replay every step safely.
+    MIGRATIONS: Tuple[str, ...] = (
+        "_migrate_base_tables",
+        "_migrate_page_indexes",
+        "_migrate_search_index",
+        "_migrate_tag_index",
+        "_migrate_timestamp_indexes",
+        "_migrate_uploads",
+        "_migrate_blobs",
+        "_migrate_tombstones",
+        "_migrate_change_seq",
+        "_migrate_job_owner",
+    )
+
+    @property
+    def schema_version(self) -> int:
+        return self.connection.execute("PRAGMA user_version").fetchone()[0]
+
+    def _migrate(self) -> None:
+        """Apply pending migrations, one transaction each."""
+        # An up-to-date database costs one pragma read and no write lock.
+        while self.schema_version < len(self.MIGRATIONS):
+            with self.transaction():
+                # Re-read inside the write lock: another process may have
+                # applied this step while we waited for it.
+                version = self.schema_version
+                if version >= len(self.MIGRATIONS):
+                    break
+                getattr(self, self.MIGRATIONS[version])()
+                self.connection.execute(f"PRAGMA user_version = {version + 1}")
+        self.search_available = (
+            self._table_exists("page_notes_fts") or self._create_search_index()
+        )
+
+    def _table_exists(self, name: str) -> bool:
+        row = self.connection.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = ?", (name,)
+        ).fetchone()
+        return row is not None
+
+    def _add_missing_columns(self, table: str, columns: Dict[str, str]) -> None:
+        cursor = self.connection.execute(f"PRAGMA table_info({table})")
+        existing = {row["name"] for row in cursor}
+        for name, definition in columns.items():
+            if name not in existing:
+                self.connection.execute(f"ALTER TABLE {table} ADD COLUMN {name} {definition}")
+
+    def _migrate_base_tables(self) -> None:
         self.connection.execute(
             """
             CREATE TABLE IF NOT EXISTS documents (
@@ -140,79 +561,648 @@ class DatabaseManager:
             )
             """
         )
-        self.connection.commit()
-        self._ensure_columns()
-
-    def _ensure_columns(self) -> None:
-        expectations = {
-            "page_notes": {
+        self.connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                doc_id TEXT NOT NULL,
+                name TEXT NOT NULL,
+                source_path TEXT NOT NULL,
+                status TEXT NOT NULL,
+                pages_done INTEGER DEFAULT 0,
+                page_count INTEGER DEFAULT 0,
+                error TEXT,
+                created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL
+            )
+            """
+        )
+        # Columns added to these tables before schema versioning existed.
+        self._add_missing_columns(
+            "page_notes",
+            {
                 "tags": "TEXT DEFAULT ''",
                 "skipped": "INTEGER DEFAULT 0",
                 "attachment_path": "TEXT",
             },
-            "page_entries": {
-                "tags": "TEXT DEFAULT ''",
-                "attachment_path": "TEXT",
-            },
-            "general_entries": {
-                "attachment_path": "TEXT",
-            },
-        }
-        for table, columns in expectations.items():
-            cursor = self.connection.execute(f"PRAGMA table_info({table})")
-            existing = {row["name"] for row in cursor}
-            for name, definition in columns.items():
-                if name not in existing:
+        )
+        self._add_missing_columns(
+            "page_entries", {"tags": "TEXT DEFAULT ''", "attachment_path": "TEXT"}
+        )
+        self._add_missing_columns("general_entries", {"attachment_path": "TEXT"})
+
+    def _migrate_page_indexes(self) -> None:
+        self.connection.execute(
+            """
+            CREATE INDEX IF NOT EXISTS idx_page_entries_doc_page
+                ON page_entries (doc_id, page_number)
+            """
+        )
+        self.connection.execute(
+            """
+            CREATE INDEX IF NOT EXISTS idx_page_entries_doc_id
+                ON page_entries (doc_id, id)
+            """
+        )
+        self.connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS page_status (
+                doc_id TEXT PRIMARY KEY,
+                flags BLOB NOT NULL,
+                FOREIGN KEY(doc_id) REFERENCES documents(doc_id) ON DELETE CASCADE
+            )
+            """
+        )
+
+    def _migrate_search_index(self) -> None:
+        self._create_search_index()
+
+    def _migrate_tag_index(self) -> None:
+        self._create_tag_index()
+
+    def _migrate_timestamp_indexes(self) -> None:
+        # Latest-entry lookups and general entry listings walk these backwards.
+        self.connection.execute(
+            """
+            CREATE INDEX IF NOT EXISTS idx_page_entries_doc_created
+                ON page_entries (doc_id, created_at)
+            """
+        )
+        self.connection.execute(
+            """
+            CREATE INDEX IF NOT EXISTS idx_general_entries_doc_created
+                ON general_entries (doc_id, created_at)
+            """
+        )
+        self.connection.execute(
+            """
+            CREATE INDEX IF NOT EXISTS idx_jobs_status_created
+                ON jobs (status, created_at)
+            """
+        )
+
+    def _migrate_uploads(self) -> None:
+        self.connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS uploads (
+                upload_id TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                received INTEGER NOT NULL DEFAULT 0,
+                sha256 TEXT,
+                created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL
+            )
+            """
+        )
+
+    def _migrate_blobs(self) -> None:
+        self._add_missing_columns("documents", {"content_hash": "TEXT"})
+        self._add_missing_columns("jobs", {"content_hash": "TEXT"})
+        self.connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS blobs (
+                sha256 TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                ref_count INTEGER NOT NULL DEFAULT 0,
+                page_count INTEGER,
+                created_at TEXT NOT NULL
+            )
+            """
+        )
+
+    def _migrate_tombstones(self) -> None:
+        self._add_missing_columns("documents", {"deleted_at": "TEXT"})
+        self.connection.execute(
+            """
+            CREATE INDEX IF NOT EXISTS idx_documents_deleted
+                ON documents (deleted_at)
+            """
+        )
+
+    def _migrate_change_seq(self) -> None:
+        """Stamp every note and entry write with a number that follows commit order.
+
+        Timestamps are taken before a transaction commits, so a slow writer
+        can commit a row older than a watermark an export already handed out.
+        Writers hold SQLite's write lock from their first write to their
+        commit, so a counter bumped inside the transaction grows in commit
+        order, and the committed counter is a gap-free export watermark.
+        Rows written before this migration keep ``seq`` 0.
+        """
+        self.connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS change_seq (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                value INTEGER NOT NULL
+            )
+            """
+        )
+        self.connection.execute("INSERT OR IGNORE INTO change_seq (id, value) VALUES (1, 0)")
+        for table, _, _ in EXPORT_SOURCES.values():
+            self._add_missing_columns(table, {"seq": "INTEGER NOT NULL DEFAULT 0"})
+            self.connection.execute(
+                f"CREATE INDEX IF NOT EXISTS idx_{table}_doc_seq ON {table} (doc_id, seq)"
+            )
+            stamp = f"""
+                BEGIN
+                    UPDATE change_seq SET value = value + 1 WHERE id = 1;
+                    UPDATE {table} SET seq = (SELECT value FROM change_seq WHERE id = 1)
+                    WHERE id = new.id;
+                END
+            """
+            self.connection.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {table}_seq_insert AFTER INSERT ON {table} {stamp}"
+            )
+            # The WHEN clause keeps the trigger's own seq update from counting again.
+            self.connection.execute(
+                f"""
+                CREATE TRIGGER IF NOT EXISTS {table}_seq_update AFTER UPDATE ON {table}
+                WHEN new.seq IS old.seq {stamp}
+                """
+            )
+
+    def _migrate_job_owner(self) -> None:
+        self._add_missing_columns("jobs", {"worker": "TEXT"})
+
+    def _create_tag_index(self) -> None:
+        """Create the normalized tag tables, parsing existing tag strings once.
+
+        ``entry_tags`` links a tag to one note, page entry or general entry
+        (``kind`` as in search results). Its (doc_id, tag_id, page_number)
+        index answers per-document tag filters and counts without scanning.
+        """
+        exists = self._table_exists("entry_tags")
+        with self.transaction():
+            self.connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS tags (
+                    id INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL UNIQUE
+                )
+                """
+            )
+            self.connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS entry_tags (
+                    kind TEXT NOT NULL,
+                    row_id INTEGER NOT NULL,
+                    tag_id INTEGER NOT NULL REFERENCES tags(id),
+                    doc_id TEXT NOT NULL,
+                    page_number INTEGER,
+                    PRIMARY KEY (kind, row_id, tag_id),
+                    FOREIGN KEY(doc_id) REFERENCES documents(doc_id) ON DELETE CASCADE
+                ) WITHOUT ROWID
+                """
+            )
+            self.connection.execute(
+                """
+                CREATE INDEX IF NOT EXISTS idx_entry_tags_doc_tag
+                    ON entry_tags (doc_id, tag_id, page_number)
+                """
+            )
+            if exists:
+                return
+            for table, (kind, _, _, paged) in SEARCH_TABLES.items():
+                page_column = "page_number" if paged else "NULL"
+                cursor = self.connection.execute(
+                    f"SELECT id, doc_id, {page_column} AS page_number, tags FROM {table} WHERE tags <> ''"
+                )
+                for row in cursor.fetchall():
+                    self._index_tags(
+                        kind, row["id"], row["doc_id"], row["page_number"], row["tags"]
+                    )
+
+    def _index_tags(
+        self,
+        kind: str,
+        row_id: int,
+        doc_id: str,
+        page_number: Optional[int],
+        tags: Optional[str],
+        replace: bool = False,
+    ) -> None:
+        """Link a row to its parsed tags; ``replace`` drops its previous links first."""
+        if replace:
+            self.connection.execute(
+                "DELETE FROM entry_tags WHERE kind = ? AND row_id = ?", (kind, row_id)
+            )
+        names = parse_tags(tags)
+        if not names:
+            return
+        self.connection.executemany(
+            "INSERT OR IGNORE INTO tags (name) VALUES (?)", [(name,) for name in names]
+        )
+        placeholders = ", ".join("?" for _ in names)
+        self.connection.execute(
+            f"""
+            INSERT OR IGNORE INTO entry_tags (kind, row_id, tag_id, doc_id, page_number)
+            SELECT ?, ?, id, ?, ? FROM tags WHERE name IN ({placeholders})
+            """,
+            (kind, row_id, doc_id, page_number, *names),
+        )
+
+    def pages_with_tag(
+        self, doc_id: str, tag: str, kinds: Iterable[str] = ("note", "entry")
+    ) -> List[int]:
+        """Page numbers whose note or entries (per ``kinds``) carry ``tag``."""
+        names = parse_tags(tag)
+        kinds = [kind for kind in kinds if kind != "general"]
+        if not names or not kinds:
+            return []
+        placeholders = ", ".join("?" for _ in kinds)
+        cursor = self.connection.execute(
+            f"""
+            SELECT DISTINCT e.page_number
+            FROM tags AS t
+            JOIN entry_tags AS e ON e.doc_id = ? AND e.tag_id = t.id
+            WHERE t.name = ? AND e.page_number IS NOT NULL AND e.kind IN ({placeholders})
+            ORDER BY e.page_number
+            """,
+            (doc_id, names[0], *kinds),
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+    def tag_counts(self, doc_id: str) -> List[Tuple[str, int]]:
+        """Every tag used in the document with how many rows carry it, most used first."""
+        cursor = self.connection.execute(
+            """
+            SELECT t.name, c.uses
+            FROM (
+                SELECT tag_id, COUNT(*) AS uses
+                FROM entry_tags
+                WHERE doc_id = ?
+                GROUP BY tag_id
+            ) AS c
+            JOIN tags AS t ON t.id = c.tag_id
+            ORDER BY c.uses DESC, t.name
+            """,
+            (doc_id,),
+        )
+        return [(row["name"], row["uses"]) for row in cursor.fetchall()]
+
+    def _create_search_index(self) -> bool:
+        """Create the FTS5 mirrors and their sync triggers; False if FTS5 is missing.
+
+        Each mirror stores doc_id (and page_number) unindexed next to the
+        searchable columns, keyed by the source row's id. Rows with no text
+        are not indexed. Rows that existed before the mirror was created are
+        queued in search_backfill and indexed in batches by
+        ``backfill_search_index`` while the app keeps serving.
+        """
+        columns = ", ".join(SEARCH_COLUMNS)
+        new_values = ", ".join(f"new.{column}" for column in SEARCH_COLUMNS)
+        has_text = " OR ".join(f"COALESCE(new.{column}, '') <> ''" for column in SEARCH_COLUMNS)
+        self.connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS search_backfill (
+                table_name TEXT PRIMARY KEY,
+                next_rowid INTEGER NOT NULL,
+                end_rowid INTEGER NOT NULL
+            )
+            """
+        )
+        try:
+            with self.transaction():
+                for table, (_, fts, _, paged) in SEARCH_TABLES.items():
+                    if self._table_exists(fts):
+                        continue
+                    keys = "doc_id, page_number" if paged else "doc_id"
+                    new_keys = "new.doc_id, new.page_number" if paged else "new.doc_id"
+                    unindexed = ", ".join(f"{key} UNINDEXED" for key in keys.split(", "))
+                    self.connection.execute(
+                        f"""
+                        CREATE VIRTUAL TABLE {fts} USING fts5(
+                            {unindexed}, {columns},
+                            tokenize = 'porter unicode61 remove_diacritics 2'
+                        )
+                        """
+                    )
+                    self.connection.execute(
+                        f"""
+                        CREATE TRIGGER {fts}_insert AFTER INSERT ON {table}
+                        WHEN {has_text}
+                        BEGIN
+                            INSERT INTO {fts} (rowid, {keys}, {columns})
+                            VALUES (new.id, {new_keys}, {new_values});
+                        END
+                        """
+                    )
                     self.connection.execute(
-                        f"ALTER TABLE {table} ADD COLUMN {name} {definition}"
+                        f"""
+                        CREATE TRIGGER {fts}_delete AFTER DELETE ON {table}
+                        BEGIN
+                            DELETE FROM {fts} WHERE rowid = old.id;
+                        END
+                        """
                     )
-        self.connection.commit()
+                    self.connection.execute(
+                        f"""
+                        CREATE TRIGGER {fts}_update AFTER UPDATE OF {columns} ON {table}
+                        BEGIN
+                            DELETE FROM {fts} WHERE rowid = old.id;
+                            INSERT INTO {fts} (rowid, {keys}, {columns})
+                            SELECT new.id, {new_keys}, {new_values} WHERE {has_text};
+                        END
+                        """
+                    )
+                    end_rowid = self.connection.execute(
+                        f"SELECT COALESCE(MAX(id), 0) FROM {table}"
+                    ).fetchone()[0]
+                    if end_rowid:
+                        self.connection.execute(
+                            "INSERT OR REPLACE INTO search_backfill VALUES (?, 0, ?)",
+                            (table, end_rowid),
+                        )
+        except sqlite3.OperationalError as exc:
+            if "fts5" not in str(exc):
+                raise
+            return False
+        return True
+
+    def search_backfill_pending(self) -> bool:
+        """True while rows from before the search index still need indexing."""
+        row = self.connection.execute(
+            "SELECT 1 FROM search_backfill WHERE next_rowid < end_rowid LIMIT 1"
+        ).fetchone()
+        return row is not None
+
+    def backfill_search_index(self, batch_size: int = 500) -> int:
+        """Index up to ``batch_size`` pre-existing rows per table; returns rows indexed.
+
+        Each batch is its own short transaction, so writers are only held up
+        for one batch. Rows the triggers indexed in the meantime are skipped.
+        """
+        indexed = 0
+        for table, next_rowid, end_rowid in self.connection.execute(
+            "SELECT table_name, next_rowid, end_rowid FROM search_backfill WHERE next_rowid < end_rowid"
+        ).fetchall():
+            _, fts, _, paged = SEARCH_TABLES[table]
+            keys = "doc_id, page_number" if paged else "doc_id"
+            columns = ", ".join(SEARCH_COLUMNS)
+            has_text = " OR ".join(f"COALESCE({column}, '') <> ''" for column in SEARCH_COLUMNS)
+            with self.transaction():
+                upper = self.connection.execute(
+                    f"""
+                    SELECT MAX(id) FROM (
+                        SELECT id FROM {table} WHERE id > ? AND id <= ? ORDER BY id LIMIT ?
+                    )
+                    """,
+                    (next_rowid, end_rowid, batch_size),
+                ).fetchone()[0]
+                if upper is None:
+                    upper = end_rowid
+                cursor = self.connection.execute(
+                    f"""
+                    INSERT INTO {fts} (rowid, {keys}, {columns})
+                    SELECT id, {keys}, {columns} FROM {table}
+                    WHERE id > ? AND id <= ? AND ({has_text})
+                      AND id NOT IN (SELECT rowid FROM {fts} WHERE rowid > ? AND rowid <= ?)
+                    """,
+                    (next_rowid, upper, next_rowid, upper),
+                )
+                indexed += max(cursor.rowcount, 0)
+                self.connection.execute(
+                    "UPDATE search_backfill SET next_rowid = ? WHERE table_name = ?",
+                    (upper, table),
+                )
+        return indexed
+
+    def search(
+        self,
+        query: str,
+        doc_id: Optional[str] = None,
+        kinds: Iterable[str] = SEARCH_KINDS,
+        limit: int = 20,
+        offset: int = 0,
+    ) -> List[SearchHit]:
+        """Rank notes, page entries and general entries matching ``query``.
+
+        ``query`` is plain text: every term must match (a trailing ``*`` makes
+        a term a prefix). Results are ordered by BM25 and paged with
+        ``limit``/``offset``.
+        """
+        match = _fts_query(query)
+        if not match:
+            return []
+        selects = []
+        params: List[Any] = []
+        for table, (kind, fts, timestamp, paged) in SEARCH_TABLES.items():
+            if kind not in kinds:
+                continue
+            snippets = ", ".join(
+                f"snippet({fts}, {index}, '{HIGHLIGHT_START}', '{HIGHLIGHT_END}', '…', 24) AS {column}"
+                for index, column in enumerate(SEARCH_COLUMNS, start=2 if paged else 1)
+            )
+            selects.append(
+                f"""
+                SELECT '{kind}' AS kind, f.rowid AS id, f.doc_id,
+                       {'f.page_number' if paged else 'NULL'} AS page_number,
+                       {snippets}, f.rank AS rank, t.{timestamp} AS timestamp
+                FROM {fts} AS f JOIN {table} AS t ON t.id = f.rowid
+                WHERE {fts} MATCH ? {'AND f.doc_id = ?' if doc_id else ''}
+                  AND NOT EXISTS (
+                      SELECT 1 FROM documents AS d
+                      WHERE d.doc_id = f.doc_id AND d.deleted_at IS NOT NULL
+                  )
+                """
+            )
+            params.extend([match, doc_id] if doc_id else [match])
+        if not selects:
+            return []
+        cursor = self.connection.execute(
+            " UNION ALL ".join(selects) + " ORDER BY rank LIMIT ? OFFSET ?",
+            (*params, limit, offset),
+        )
+        return [self._row_to_search_hit(row) for row in cursor.fetchall()]
 
     def create_document(
-        self, doc_id: str, name: str, source_path: Path, page_count: int
+        self,
+        doc_id: str,
+        name: str,
+        source_path: Path,
+        page_count: int,
+        content_hash: Optional[str] = None,
     ) -> None:
         """Add metadata for a new document."""
         now = datetime.utcnow().isoformat()
         self.connection.execute(
             """
             INSERT OR REPLACE INTO documents
-                (doc_id, name, source_path, page_count, created_at, updated_at)
-            VALUES (?, ?, ?, ?, ?, ?)
+                (doc_id, name, source_path, page_count, created_at, updated_at, content_hash)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
             """,
-            (doc_id, name, str(source_path), page_count, now, now),
+            (doc_id, name, str(source_path), page_count, now, now, content_hash),
         )
-        self.connection.commit()
+        self._commit()
+        self._invalidate(doc_id)
 
     def list_documents(self) -> List[Document]:
         """Return every uploaded PDF sorted by creation time descending."""
         cursor = self.connection.execute(
-            "SELECT * FROM documents ORDER BY created_at DESC"
+            "SELECT * FROM documents WHERE deleted_at IS NULL ORDER BY created_at DESC"
         )
         return [self._row_to_document(row) for row in cursor.fetchall()]
 
     def get_document(self, doc_id: str) -> Optional[Document]:
-        """Load the document identified by ``doc_id``."""
+        """Load the document identified by ``doc_id`` (served from the read cache)."""
+        self._check_external_writes()
+        hit, doc = self.cache.get(("document", doc_id))
+        if hit:
+            return doc
+        generation = self.cache.generation
         cursor = self.connection.execute(
-            "SELECT * FROM documents WHERE doc_id = ?", (doc_id,)
+            "SELECT * FROM documents WHERE doc_id = ? AND deleted_at IS NULL", (doc_id,)
         )
         row = cursor.fetchone()
-        return self._row_to_document(row) if row else None
+        if not row:
+            return None
+        doc = self._row_to_document(row)
+        self.cache.put(("document", doc_id), doc, generation)
+        return doc
+
+    def document_is_live(self, doc_id: str) -> bool:
+        """Whether ``doc_id`` exists and is not tombstoned, read past the cache.
+
+        Inside ``transaction()`` the answer holds until the commit: the
+        tombstone needs the same write lock. The cache could still hold a
+        row that another thread loaded just before the tombstone committed.
+        """
+        row = self.connection.execute(
+            "SELECT 1 FROM documents WHERE doc_id = ? AND deleted_at IS NULL", (doc_id,)
+        ).fetchone()
+        return row is not None
+
+    def delete_document(self, doc_id: str) -> bool:
+        """Remove a document and cascade the clean-up through SQLite.
+
+        For a document with a long history, ``purge_document_rows`` first so
+        this statement has little left to cascade.
+        """
+        cursor = self.connection.execute("DELETE FROM documents WHERE doc_id = ?", (doc_id,))
+        self._commit()
+        self._invalidate(doc_id)
+        return cursor.rowcount > 0
+
+    def mark_document_deleted(self, doc_id: str) -> bool:
+        """Tombstone a document: it disappears from reads at once; False if already gone."""
+        cursor = self.connection.execute(
+            "UPDATE documents SET deleted_at = ? WHERE doc_id = ? AND deleted_at IS NULL",
+            (datetime.utcnow().isoformat(), doc_id),
+        )
+        self._commit()
+        self._invalidate(doc_id)
+        return cursor.rowcount > 0
+
+    def list_deleted_documents(self, limit: int = 100) -> List[Document]:
+        """Tombstoned documents, oldest deletion first."""
+        cursor = self.connection.execute(
+            """
+            SELECT * FROM documents WHERE deleted_at IS NOT NULL
+            ORDER BY deleted_at LIMIT ?
+            """,
+            (limit,),
+        )
+        return [self._row_to_document(row) for row in cursor.fetchall()]
 
-    def delete_document(self, doc_id: str) -> None:
-        """Remove a document and cascade the clean-up through SQLite."""
-        self.connection.execute("DELETE FROM documents WHERE doc_id = ?", (doc_id,))
-        self.connection.commit()
+    def purge_document_rows(self, doc_id: str, batch_size: int = 500) -> int:
+        """Delete up to ``batch_size`` rows from each of a document's tables.
+
+        Each call is one short transaction; call it until it returns 0. The
+        tables are emptied children first, so an interrupted purge leaves
+        consistent data and can simply be resumed.
+        """
+        deleted = 0
+        with self.transaction():
+            for table, key in PURGE_TABLES:
+                cursor = self.connection.execute(
+                    f"""
+                    DELETE FROM {table} WHERE ({key}) IN (
+                        SELECT {key} FROM {table} WHERE doc_id = ? LIMIT ?
+                    )
+                    """,
+                    (doc_id, batch_size),
+                )
+                deleted += cursor.rowcount
+        return deleted
+
+    def storage_key_in_use(self, key: str) -> bool:
+        """Whether a split, thumbnail or attachment folder named ``key`` is still referenced.
+
+        Folders are named after a document (deleted or not), a stored blob, or
+        the document an unfinished job is about to create.
+        """
+        placeholders = ", ".join("?" for _ in UNFINISHED_JOB_STATES)
+        row = self.connection.execute(
+            f"""
+            SELECT EXISTS (SELECT 1 FROM documents WHERE doc_id = ?)
+                OR EXISTS (SELECT 1 FROM blobs WHERE sha256 = ?)
+                OR EXISTS (
+                    SELECT 1 FROM jobs WHERE status IN ({placeholders}) AND doc_id = ?
+                )
+            """,
+            (key, key, *UNFINISHED_JOB_STATES, key),
+        ).fetchone()
+        return bool(row[0])
 
     def ensure_page_entries(self, doc_id: str, total_pages: int) -> None:
         """Populate every page for the document if the row is missing."""
-        now = datetime.utcnow().isoformat()
-        insert = """
-        INSERT OR IGNORE INTO page_notes (doc_id, page_number, updated_at)
-        VALUES (?, ?, ?)
+        with self.transaction():
+            self._insert_page_rows(doc_id, total_pages, datetime.utcnow().isoformat())
+
+    def _insert_page_rows(self, doc_id: str, total_pages: int, now: str) -> None:
+        # A recursive CTE generates 1..total_pages inside SQLite, so the rows
+        # go in with one statement instead of one round trip per page.
+        self.connection.execute(
+            """
+            WITH RECURSIVE pages(page_number) AS (
+                SELECT 1 WHERE ? >= 1
+                UNION ALL
+                SELECT page_number + 1 FROM pages WHERE page_number < ?
+            )
+            INSERT OR IGNORE INTO page_notes (doc_id, page_number, updated_at)
+            SELECT ?, page_number, ? FROM pages
+            """,
+            (total_pages, total_pages, doc_id, now),
+        )
+        self._save_status(doc_id, self._build_status(doc_id))
+        self._invalidate(doc_id, document=False)
+
+    def import_documents(self, documents: Iterable[Document]) -> int:
+        """Insert documents and their page rows together, for migration scripts.
+
+        Existing documents keep their page notes; their metadata is refreshed
+        and any missing page rows are added. Returns the number imported.
         """
-        for page_number in range(1, total_pages + 1):
-            self.connection.execute(insert, (doc_id, page_number, now))
-        self.connection.commit()
+        imported = 0
+        with self.transaction():
+            for doc in documents:
+                self.connection.execute(
+                    """
+                    INSERT INTO documents
+                        (doc_id, name, source_path, page_count, created_at, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(doc_id) DO UPDATE SET
+                        name=excluded.name,
+                        source_path=excluded.source_path,
+                        page_count=excluded.page_count,
+                        updated_at=excluded.updated_at
+                    """,
+                    (
+                        doc.doc_id,
+                        doc.name,
+                        str(doc.source_path),
+                        doc.page_count,
+                        doc.created_at.isoformat(),
+                        doc.updated_at.isoformat(),
+                    ),
+                )
+                self._insert_page_rows(
+                    doc.doc_id, doc.page_count, doc.updated_at.isoformat()
+                )
+                self._invalidate(doc.doc_id)
+                imported += 1
+        return imported
 
     def upsert_page_note(
         self,
@@ -253,10 +1243,17 @@ class DatabaseManager:
                 now,
             ),
         )
+        note_id = self.connection.execute(
+            "SELECT id FROM page_notes WHERE doc_id = ? AND page_number = ?",
+            (doc_id, page_number),
+        ).fetchone()["id"]
+        self._index_tags("note", note_id, doc_id, page_number, tags, replace=True)
         self.connection.execute(
             "UPDATE documents SET updated_at = ? WHERE doc_id = ?", (now, doc_id)
         )
-        self.connection.commit()
+        self._update_status(doc_id, page_number, COMPLETE, complete)
+        self._commit()
+        self._invalidate(doc_id)
 
     def add_page_entry(
         self,
@@ -272,7 +1269,7 @@ class DatabaseManager:
     ) -> None:
         """Persist a historical entry for auditing or review."""
         now = datetime.utcnow().isoformat()
-        self.connection.execute(
+        cursor = self.connection.execute(
             """
             INSERT INTO page_entries
                 (doc_id, page_number, author, user_input, output, complete, ignored, tags, attachment_path, created_at)
@@ -291,7 +1288,9 @@ class DatabaseManager:
                 now,
             ),
         )
-        self.connection.commit()
+        self._index_tags("entry", cursor.lastrowid, doc_id, page_number, tags)
+        self._commit()
+        self._invalidate(doc_id, document=False)
 
     def get_latest_page_entry(self, doc_id: str) -> Optional[PageEntry]:
         cursor = self.connection.execute(
@@ -307,17 +1306,61 @@ class DatabaseManager:
         return self._row_to_page_entry(row) if row else None
 
     def get_random_page_entry(self, doc_id: str) -> Optional[PageEntry]:
-        cursor = self.connection.execute(
+        sample = self.sample_page_entries(doc_id, 1)
+        return sample[0] if sample else None
+
+    def sample_page_entries(self, doc_id: str, count: int) -> List[PageEntry]:
+        """Draw up to ``count`` distinct entries uniformly at random, in random order.
+
+        Ids are probed at random within the document's id range through the
+        (doc_id, id) index and kept only on an exact hit, so each probe is an
+        O(log n) lookup and the draw stays uniform however other documents'
+        ids interleave. When the document is too sparse in its range for
+        probes to pay off, the rest are drawn from its id list instead.
+        """
+        if count < 1:
+            return []
+        low, high = self.connection.execute(
             """
-            SELECT * FROM page_entries
-            WHERE doc_id = ?
-            ORDER BY RANDOM()
-            LIMIT 1
+            SELECT (SELECT MIN(id) FROM page_entries WHERE doc_id = ?),
+                   (SELECT MAX(id) FROM page_entries WHERE doc_id = ?)
             """,
-            (doc_id,),
-        )
-        row = cursor.fetchone()
-        return self._row_to_page_entry(row) if row else None
+            (doc_id, doc_id),
+        ).fetchone()
+        if low is None:
+            return []
+        chosen: List[int] = []
+        tried: Set[int] = set()
+        for _ in range(count * SAMPLE_PROBES):
+            if len(chosen) == count or len(tried) > high - low:
+                break
+            candidate = random.randint(low, high)
+            if candidate in tried:
+                continue
+            tried.add(candidate)
+            hit = self.connection.execute(
+                "SELECT 1 FROM page_entries WHERE id = ? AND doc_id = ?",
+                (candidate, doc_id),
+            ).fetchone()
+            if hit:
+                chosen.append(candidate)
+        if len(chosen) < count:
+            taken = set(chosen)
+            cursor = self.connection.execute(
+                "SELECT id FROM page_entries WHERE doc_id = ?", (doc_id,)
+            )
+            remaining = [row[0] for row in cursor if row[0] not in taken]
+            chosen += random.sample(remaining, min(count - len(chosen), len(remaining)))
+        if not chosen:
+            return []
+        placeholders = ", ".join("?" for _ in chosen)
+        rows = {
+            row["id"]: row
+            for row in self.connection.execute(
+                f"SELECT * FROM page_entries WHERE id IN ({placeholders})", chosen
+            )
+        }
+        return [self._row_to_page_entry(rows[entry_id]) for entry_id in chosen]
 
     def add_general_entry(
         self,
@@ -329,7 +1372,7 @@ class DatabaseManager:
         attachment_path: Optional[str] = None,
     ) -> None:
         now = datetime.utcnow().isoformat()
-        self.connection.execute(
+        cursor = self.connection.execute(
             """
             INSERT INTO general_entries
                 (doc_id, author, user_input, output, tags, attachment_path, created_at)
@@ -337,7 +1380,8 @@ class DatabaseManager:
             """,
             (doc_id, author, user_input, output, tags, attachment_path, now),
         )
-        self.connection.commit()
+        self._index_tags("general", cursor.lastrowid, doc_id, None, tags)
+        self._commit()
 
     def list_general_entries(self, doc_id: str, limit: int = 20) -> List[GeneralEntry]:
         cursor = self.connection.execute(
@@ -354,6 +1398,52 @@ class DatabaseManager:
         row = cursor.fetchone()
         return self._row_to_general_entry(row) if row else None
 
+    def export_watermark(self) -> int:
+        """Return the change sequence number of the last committed note or entry write.
+
+        This is the global ``change_seq`` counter, shared by every document,
+        so it costs one row read. An export bounded by it sees every write
+        committed before the call, whichever document it belongs to.
+        """
+        row = self.connection.execute("SELECT value FROM change_seq WHERE id = 1").fetchone()
+        return row[0] if row else 0
+
+    def iter_export_rows(
+        self, doc_id: str, since: Optional[int] = None, until: Optional[int] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """Yield the document's notes, page entries and general entries as flat dicts.
+
+        Every dict has the ``EXPORT_FIELDS`` keys; ``timestamp`` is a note's
+        ``updated_at`` or an entry's ``created_at`` and ``seq`` its change
+        sequence number, limited to ``since < seq <= until``. Rows stream
+        straight off the cursors in ``(doc_id, seq)`` index order, so memory
+        use does not depend on the document's size.
+        """
+        for kind, (table, columns, timestamp) in EXPORT_SOURCES.items():
+            clauses = ["doc_id = ?"]
+            params: List[Any] = [doc_id]
+            if since is not None:
+                clauses.append("seq > ?")
+                params.append(since)
+            if until is not None:
+                clauses.append("seq <= ?")
+                params.append(until)
+            cursor = self.connection.execute(
+                f"""
+                SELECT '{kind}' AS kind, {columns}, {timestamp} AS timestamp, seq
+                FROM {table}
+                WHERE {' AND '.join(clauses)}
+                ORDER BY seq, id
+                """,
+                params,
+            )
+            for row in cursor:
+                record = dict(zip(row.keys(), row))
+                for flag in ("complete", "ignored", "skipped"):
+                    if record[flag] is not None:
+                        record[flag] = bool(record[flag])
+                yield record
+
     def get_entry_count(self, doc_id: str, page_number: int) -> int:
         """Return how many entries exist for this document page."""
         cursor = self.connection.execute(
@@ -366,25 +1456,31 @@ class DatabaseManager:
         self, doc_id: str, page_number: int, ignored: bool
     ) -> None:
         """Toggle the ignored flag so resume will skip the page."""
-        self.connection.execute(
+        cursor = self.connection.execute(
             """
             UPDATE page_notes SET ignored = ? WHERE doc_id = ? AND page_number = ?
             """,
             (int(ignored), doc_id, page_number),
         )
-        self.connection.commit()
+        if cursor.rowcount:
+            self._update_status(doc_id, page_number, IGNORED, ignored)
+        self._commit()
+        self._invalidate(doc_id, document=False)
 
     def set_page_skipped(
         self, doc_id: str, page_number: int, skipped: bool
     ) -> None:
         """Mark a page as skipped (yellow queue) without removing it from resume logic."""
-        self.connection.execute(
+        cursor = self.connection.execute(
             """
             UPDATE page_notes SET skipped = ? WHERE doc_id = ? AND page_number = ?
             """,
             (int(skipped), doc_id, page_number),
         )
-        self.connection.commit()
+        if cursor.rowcount:
+            self._update_status(doc_id, page_number, SKIPPED, skipped)
+        self._commit()
+        self._invalidate(doc_id, document=False)
 
     def fetch_page_notes(self, doc_id: str) -> List[PageNote]:
         """Return a complete list of page notes for rendering the UI."""
@@ -394,14 +1490,316 @@ class DatabaseManager:
         )
         return [self._row_to_note(row) for row in cursor.fetchall()]
 
+    def get_page_note(self, doc_id: str, page_number: int) -> Optional[PageNote]:
+        """Load the current note for a single page."""
+        cursor = self.connection.execute(
+            "SELECT * FROM page_notes WHERE doc_id = ? AND page_number = ?",
+            (doc_id, page_number),
+        )
+        row = cursor.fetchone()
+        return self._row_to_note(row) if row else None
+
+    def fetch_page_summaries(
+        self, doc_id: str, after_page: int = 0, limit: Optional[int] = None
+    ) -> List[PageSummary]:
+        """Return page flags and entry counts for the document.
+
+        ``after_page``/``limit`` select a keyset window of pages numbered above
+        ``after_page``. The full list comes from one grouped query and is
+        served from the read cache until a write to the document's pages or
+        entries invalidates it; windows are sliced from it when cached and
+        otherwise seek through the page indexes, so their cost does not grow
+        with the document.
+        """
+        self._check_external_writes()
+        hit, summaries = self.cache.get(("pages", doc_id))
+        if hit:
+            start = bisect_right(
+                summaries, after_page, key=lambda summary: summary.page_number
+            )
+            return summaries[start : None if limit is None else start + limit]
+        if after_page or limit is not None:
+            return self._fetch_page_window(doc_id, after_page, limit)
+        generation = self.cache.generation
+        cursor = self.connection.execute(
+            """
+            SELECT n.page_number, n.complete, n.ignored, n.skipped,
+                   COALESCE(c.entry_count, 0) AS entry_count
+            FROM page_notes AS n
+            LEFT JOIN (
+                SELECT page_number, COUNT(*) AS entry_count
+                FROM page_entries
+                WHERE doc_id = ?
+                GROUP BY page_number
+            ) AS c ON c.page_number = n.page_number
+            WHERE n.doc_id = ?
+            ORDER BY n.page_number
+            """,
+            (doc_id, doc_id),
+        )
+        summaries = [self._row_to_page_summary(row) for row in cursor.fetchall()]
+        self.cache.put(("pages", doc_id), summaries, generation)
+        return list(summaries)
+
+    def _fetch_page_window(
+        self, doc_id: str, after_page: int, limit: Optional[int]
+    ) -> List[PageSummary]:
+        cursor = self.connection.execute(
+            """
+            SELECT n.page_number, n.complete, n.ignored, n.skipped,
+                   (SELECT COUNT(*) FROM page_entries AS e
+                    WHERE e.doc_id = n.doc_id AND e.page_number = n.page_number
+                   ) AS entry_count
+            FROM page_notes AS n
+            WHERE n.doc_id = ? AND n.page_number > ?
+            ORDER BY n.page_number
+            LIMIT ?
+            """,
+            (doc_id, after_page, -1 if limit is None else limit),
+        )
+        return [self._row_to_page_summary(row) for row in cursor.fetchall()]
+
+    def get_page_status(self, doc_id: str) -> PageStatusMap:
+        """Return the document's packed page flags (served from the read cache).
+
+        The map is shared with other readers and must not be modified.
+        """
+        self._check_external_writes()
+        hit, status = self.cache.get(("status", doc_id))
+        if hit:
+            return status
+        generation = self.cache.generation
+        row = self.connection.execute(
+            "SELECT flags FROM page_status WHERE doc_id = ?", (doc_id,)
+        ).fetchone()
+        if row is not None:
+            status = PageStatusMap(row["flags"])
+        else:
+            # Databases from before the page_status table get their blob on first read.
+            status = self._build_status(doc_id)
+            if len(status):
+                with self.transaction():
+                    self._save_status(doc_id, status)
+        self.cache.put(("status", doc_id), status, generation)
+        return status
+
+    def _build_status(self, doc_id: str) -> PageStatusMap:
+        # Rows past the document's last page (saved before page numbers were
+        # validated) would otherwise show up as pending pages.
+        cursor = self.connection.execute(
+            """
+            SELECT page_number, complete, ignored, skipped FROM page_notes
+            WHERE doc_id = ?
+              AND page_number <= (SELECT page_count FROM documents WHERE doc_id = ?)
+            """,
+            (doc_id, doc_id),
+        )
+        return PageStatusMap.from_rows(tuple(row) for row in cursor)
+
+    def _save_status(self, doc_id: str, status: PageStatusMap) -> None:
+        self.connection.execute(
+            "INSERT OR REPLACE INTO page_status (doc_id, flags) VALUES (?, ?)",
+            (doc_id, status.to_bytes()),
+        )
+
+    def _update_status(self, doc_id: str, page_number: int, flag: int, on: bool) -> None:
+        """Mirror a page_notes flag change into the stored blob, in the same transaction.
+
+        The map never grows past the document's page count, so a page number
+        outside the document cannot add phantom pending pages.
+        """
+        row = self.connection.execute(
+            """
+            SELECT documents.page_count, page_status.flags FROM documents
+            LEFT JOIN page_status ON page_status.doc_id = documents.doc_id
+            WHERE documents.doc_id = ?
+            """,
+            (doc_id,),
+        ).fetchone()
+        if row is None or not 1 <= page_number <= row["page_count"]:
+            return
+        if row["flags"] is None or page_number > len(row["flags"]):
+            status = self._build_status(doc_id)
+        else:
+            status = PageStatusMap(row["flags"])
+            status.update(page_number, flag, on)
+        self._save_status(doc_id, status)
+
     def get_first_incomplete(self, doc_id: str) -> Optional[PageNote]:
         """Return the earliest page that is neither complete nor ignored."""
+        page_number = self.get_page_status(doc_id).first_pending()
+        return self.get_page_note(doc_id, page_number) if page_number else None
+
+    def create_job(
+        self,
+        job_id: str,
+        doc_id: str,
+        name: str,
+        source_path: Path,
+        content_hash: Optional[str] = None,
+    ) -> Job:
+        """Queue ingestion of an uploaded file that has not been split yet.
+
+        The job belongs to the calling process, which is expected to run it.
+        """
+        now = datetime.utcnow().isoformat()
+        self.connection.execute(
+            """
+            INSERT INTO jobs
+                (job_id, doc_id, name, source_path, status, created_at, updated_at,
+                 content_hash, worker)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                job_id, doc_id, name, str(source_path), JOB_QUEUED, now, now,
+                content_hash, process_id(),
+            ),
+        )
+        self._commit()
+        job = self.get_job(job_id)
+        assert job is not None
+        return job
+
+    def get_job(self, job_id: str) -> Optional[Job]:
         cursor = self.connection.execute(
-            "SELECT * FROM page_notes WHERE doc_id = ? AND complete = 0 AND ignored = 0 ORDER BY page_number LIMIT 1",
-            (doc_id,),
+            "SELECT * FROM jobs WHERE job_id = ?", (job_id,)
         )
         row = cursor.fetchone()
-        return self._row_to_note(row) if row else None
+        return self._row_to_job(row) if row else None
+
+    def update_job(
+        self,
+        job_id: str,
+        status: Optional[str] = None,
+        pages_done: Optional[int] = None,
+        page_count: Optional[int] = None,
+        error: Optional[str] = None,
+    ) -> None:
+        """Record job progress; fields left as ``None`` keep their value."""
+        self.connection.execute(
+            """
+            UPDATE jobs SET
+                status = COALESCE(?, status),
+                pages_done = COALESCE(?, pages_done),
+                page_count = COALESCE(?, page_count),
+                error = COALESCE(?, error),
+                updated_at = ?
+            WHERE job_id = ?
+            """,
+            (status, pages_done, page_count, error, datetime.utcnow().isoformat(), job_id),
+        )
+        self._commit()
+
+    def list_unfinished_jobs(self) -> List[Job]:
+        """Return jobs interrupted before completion, oldest first."""
+        placeholders = ", ".join("?" for _ in UNFINISHED_JOB_STATES)
+        cursor = self.connection.execute(
+            f"SELECT * FROM jobs WHERE status IN ({placeholders}) ORDER BY created_at",
+            UNFINISHED_JOB_STATES,
+        )
+        return [self._row_to_job(row) for row in cursor.fetchall()]
+
+    def claim_job(self, job_id: str, previous_worker: Optional[str]) -> bool:
+        """Take over a job from ``previous_worker``; False if another process got there first."""
+        cursor = self.connection.execute(
+            "UPDATE jobs SET worker = ? WHERE job_id = ? AND worker IS ?",
+            (process_id(), job_id, previous_worker),
+        )
+        self._commit()
+        return cursor.rowcount > 0
+
+    def get_blob(self, sha256: str) -> Optional[Blob]:
+        cursor = self.connection.execute("SELECT * FROM blobs WHERE sha256 = ?", (sha256,))
+        row = cursor.fetchone()
+        return self._row_to_blob(row) if row else None
+
+    def acquire_blob(self, sha256: str, size: int) -> bool:
+        """Add a reference to a blob, creating its row if needed; True if it already existed."""
+        with self.transaction():
+            cursor = self.connection.execute(
+                "UPDATE blobs SET ref_count = ref_count + 1 WHERE sha256 = ?", (sha256,)
+            )
+            if cursor.rowcount:
+                return True
+            self.connection.execute(
+                """
+                INSERT INTO blobs (sha256, size, ref_count, created_at)
+                VALUES (?, ?, 1, ?)
+                """,
+                (sha256, size, datetime.utcnow().isoformat()),
+            )
+            return False
+
+    def release_blob(self, sha256: str) -> int:
+        """Drop a reference and return how many remain; the row goes with the last one."""
+        with self.transaction():
+            self.connection.execute(
+                "UPDATE blobs SET ref_count = ref_count - 1 WHERE sha256 = ? AND ref_count > 0",
+                (sha256,),
+            )
+            row = self.connection.execute(
+                "SELECT ref_count FROM blobs WHERE sha256 = ?", (sha256,)
+            ).fetchone()
+            if row is None or row[0] == 0:
+                self.connection.execute("DELETE FROM blobs WHERE sha256 = ?", (sha256,))
+                return 0
+            return row[0]
+
+    def set_blob_page_count(self, sha256: str, page_count: int) -> None:
+        self.connection.execute(
+            "UPDATE blobs SET page_count = ? WHERE sha256 = ?", (page_count, sha256)
+        )
+        self._commit()
+
+    def create_upload(
+        self, upload_id: str, name: str, size: int, sha256: Optional[str] = None
+    ) -> Upload:
+        """Start a chunked upload of ``size`` bytes, optionally with its expected SHA-256."""
+        now = datetime.utcnow().isoformat()
+        self.connection.execute(
+            """
+            INSERT INTO uploads (upload_id, name, size, received, sha256, created_at, updated_at)
+            VALUES (?, ?, ?, 0, ?, ?, ?)
+            """,
+            (upload_id, name, size, sha256, now, now),
+        )
+        self._commit()
+        upload = self.get_upload(upload_id)
+        assert upload is not None
+        return upload
+
+    def get_upload(self, upload_id: str) -> Optional[Upload]:
+        cursor = self.connection.execute(
+            "SELECT * FROM uploads WHERE upload_id = ?", (upload_id,)
+        )
+        row = cursor.fetchone()
+        return self._row_to_upload(row) if row else None
+
+    def advance_upload(self, upload_id: str, offset: int, received: int) -> bool:
+        """Move ``received`` from ``offset`` forward; False if another chunk got there first."""
+        cursor = self.connection.execute(
+            """
+            UPDATE uploads SET received = ?, updated_at = ?
+            WHERE upload_id = ? AND received = ?
+            """,
+            (received, datetime.utcnow().isoformat(), upload_id, offset),
+        )
+        self._commit()
+        return cursor.rowcount == 1
+
+    def delete_upload(self, upload_id: str) -> bool:
+        cursor = self.connection.execute(
+            "DELETE FROM uploads WHERE upload_id = ?", (upload_id,)
+        )
+        self._commit()
+        return cursor.rowcount == 1
+
+    def list_stale_uploads(self, before: datetime) -> List[Upload]:
+        """Uploads that have not received a chunk since ``before``."""
+        cursor = self.connection.execute(
+            "SELECT * FROM uploads WHERE updated_at < ?", (before.isoformat(),)
+        )
+        return [self._row_to_upload(row) for row in cursor.fetchall()]
 
     def _row_to_note(self, row: sqlite3.Row) -> PageNote:
         return PageNote(
@@ -419,6 +1817,65 @@ class DatabaseManager:
             updated_at=datetime.fromisoformat(row["updated_at"]),
         )
 
+    def _row_to_page_summary(self, row: sqlite3.Row) -> PageSummary:
+        return PageSummary(
+            page_number=row["page_number"],
+            complete=bool(row["complete"]),
+            ignored=bool(row["ignored"]),
+            skipped=bool(row["skipped"]),
+            entry_count=int(row["entry_count"]),
+        )
+
+    def _row_to_search_hit(self, row: sqlite3.Row) -> SearchHit:
+        return SearchHit(
+            kind=row["kind"],
+            id=row["id"],
+            doc_id=row["doc_id"],
+            page_number=row["page_number"],
+            author=row["author"] or "",
+            user_input=row["user_input"] or "",
+            output=row["output"] or "",
+            tags=row["tags"] or "",
+            rank=row["rank"],
+            timestamp=datetime.fromisoformat(row["timestamp"]),
+        )
+
+    def _row_to_job(self, row: sqlite3.Row) -> Job:
+        return Job(
+            job_id=row["job_id"],
+            doc_id=row["doc_id"],
+            name=row["name"],
+            source_path=row["source_path"],
+            status=row["status"],
+            pages_done=row["pages_done"],
+            page_count=row["page_count"],
+            error=row["error"],
+            created_at=datetime.fromisoformat(row["created_at"]),
+            updated_at=datetime.fromisoformat(row["updated_at"]),
+            content_hash=row["content_hash"],
+            worker=row["worker"],
+        )
+
+    def _row_to_blob(self, row: sqlite3.Row) -> Blob:
+        return Blob(
+            sha256=row["sha256"],
+            size=row["size"],
+            ref_count=row["ref_count"],
+            page_count=row["page_count"],
+            created_at=datetime.fromisoformat(row["created_at"]),
+        )
+
+    def _row_to_upload(self, row: sqlite3.Row) -> Upload:
+        return Upload(
+            upload_id=row["upload_id"],
+            name=row["name"],
+            size=row["size"],
+            received=row["received"],
+            sha256=row["sha256"],
+            created_at=datetime.fromisoformat(row["created_at"]),
+            updated_at=datetime.fromisoformat(row["updated_at"]),
+        )
+
     def _row_to_document(self, row: sqlite3.Row) -> Document:
         return Document(
             doc_id=row["doc_id"],
@@ -427,6 +1884,10 @@ class DatabaseManager:
             page_count=row["page_count"],
             created_at=datetime.fromisoformat(row["created_at"]),
             updated_at=datetime.fromisoformat(row["updated_at"]),
+            content_hash=row["content_hash"],
+            deleted_at=(
+                datetime.fromisoformat(row["deleted_at"]) if row["deleted_at"] else None
+            ),
         )
 
     def _row_to_general_entry(self, row: sqlite3.Row) -> GeneralEntry:
@@ -455,4 +1916,24 @@ class DatabaseManager:
         )
 
     def close(self) -> None:
-        self.connection.close()
+        """Close every pooled connection, including other threads' ones."""
+        with self._connections_lock:
+            for connection in self._connections.values():
+                connection.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+
+def _fts_query(text: str) -> str:
+    """Turn free text into an FTS5 query that ANDs quoted terms.
+
+    Quoting keeps FTS5 operators and punctuation in user input from being
+    parsed as query syntax; a trailing ``*`` is kept as a prefix match.
+    """
+    terms = []
+    for word in text.split():
+        prefix = word.endswith("*")
+        word = word.rstrip("*").replace('"', '""')
+        if word:
+            terms.append(f'"{word}"' + ("*" if prefix else ""))
+    return " ".join(terms)
@@ -0,0 +1,152 @@
+"""Streaming exports of a document's notes and entry history.
+
+Records come from ``DatabaseManager.iter_export_rows`` one row at a time and
+are encoded and, optionally, gzip-compressed as they go, so an export of any
+size holds only one output buffer in memory.
+
+Formats:
+
+``jsonl``
+    One JSON object per record.
+``csv``
+    A header row of ``EXPORT_FIELDS`` followed by one row per record.
+``columns``
+    A compact columnar layout: a header line naming the fields, then one JSON
+    line per batch of up to ``COLUMN_BATCH`` records holding one array per
+    field. Repeated values such as ``doc_id`` and ``kind`` sit next to each
+    other, which is what makes the gzip-compressed form small.
+
+Incremental exports pass the ``until`` watermark of the previous export as
+``since``. Watermarks are change sequence numbers that follow commit order,
+and records are selected by ``since < seq <= until``, so a write that
+commits after an export started is picked up by the next one.
+"""
+from __future__ import annotations
+
+import csv
+import io
+import json
+import zlib
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional
+
+from .db import EXPORT_FIELDS, DatabaseManager
+
+COLUMN_BATCH = 1000
+# Encoded output is gathered into chunks of about this size before it is
+# yielded, so streaming responses are not a chunk per record.
+CHUNK_SIZE = 64 * 1024
+COLUMNS_FORMAT = "pdfnotebook-columns"
+
+
+def iter_jsonl(records: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    for record in records:
+        yield json.dumps(record, ensure_ascii=False) + "\n"
+
+
+def iter_csv(records: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+    for record in records:
+        writer.writerow(["" if record[field] is None else record[field] for field in EXPORT_FIELDS])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def iter_columns(
+    records: Iterable[Dict[str, Any]], batch_size: int = COLUMN_BATCH
+) -> Iterator[str]:
+    yield json.dumps({"format": COLUMNS_FORMAT, "version": 1, "fields": EXPORT_FIELDS}) + "\n"
+    columns: Dict[str, list] = {field: [] for field in EXPORT_FIELDS}
+    rows = 0
+    for record in records:
+        for field in EXPORT_FIELDS:
+            columns[field].append(record[field])
+        rows += 1
+        if rows == batch_size:
+            yield json.dumps({"rows": rows, "columns": columns}, ensure_ascii=False) + "\n"
+            columns = {field: [] for field in EXPORT_FIELDS}
+            rows = 0
+    if rows:
+        yield json.dumps({"rows": rows, "columns": columns}, ensure_ascii=False) + "\n"
+
+
+# Format name -> (encoder, MIME type, file extension).
+FORMATS: Dict[str, tuple[Callable[[Iterable[Dict[str, Any]]], Iterator[str]], str, str]] = {
+    "jsonl": (iter_jsonl, "application/x-ndjson", "jsonl"),
+    "csv": (iter_csv, "text/csv", "csv"),
+    "columns": (iter_columns, "application/x-ndjson", "columns.jsonl"),
+}
+
+
+def _chunked(parts: Iterable[str], size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    pending: list[bytes] = []
+    pending_size = 0
+    for part in parts:
+        data = part.encode("utf-8")
+        pending.append(data)
+        pending_size += len(data)
+        if pending_size >= size:
+            yield b"".join(pending)
+            pending = []
+            pending_size = 0
+    if pending:
+        yield b"".join(pending)
+
+
+def gzip_stream(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    """Compress a byte stream into a single gzip member as it is produced."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def parse_watermark(text: str) -> int:
+    """Parse a ``since`` value; raises ``ValueError`` unless it is a non-negative integer."""
+    value = int(text.strip())
+    if value < 0:
+        raise ValueError(text)
+    return value
+
+
+def export_window(db: DatabaseManager, since: Optional[int] = None) -> int:
+    """Return the ``until`` bound for an export, which is also the next ``since``.
+
+    The bound is a global change number, not one per document, so it may
+    move on between exports of a document nobody wrote to.
+    """
+    until = db.export_watermark()
+    if since is not None and until < since:
+        return since
+    return until
+
+
+def export_filename(doc_id: str, fmt: str, compress: bool = False) -> str:
+    extension = FORMATS[fmt][2]
+    return f"{doc_id}-notes.{extension}{'.gz' if compress else ''}"
+
+
+def export_stream(
+    db: DatabaseManager,
+    doc_id: str,
+    fmt: str = "jsonl",
+    since: Optional[int] = None,
+    until: Optional[int] = None,
+    compress: bool = False,
+) -> Iterator[bytes]:
+    """Yield the encoded export of one document as byte chunks.
+
+    Pass ``until=export_window(db, since)`` (read before streaming)
+    and hand the same value to the next export as ``since`` to resume without
+    gaps or repeats.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    encode = FORMATS[fmt][0]
+    chunks = _chunked(encode(db.iter_export_rows(doc_id, since=since, until=until)))
+    return gzip_stream(chunks) if compress else chunks
@@ -0,0 +1,83 @@
+"""Reset per-process state in children forked by a preforking server.
+
+A server such as gunicorn imports the app once and then forks its workers.
+SQLite connections, thread pools and locks copied across that fork belong to
+the parent: the pools' threads do not exist in the child and a lock held by
+one of them at fork time would never be released. Objects that own such
+state register a method here and it runs in each new child before any other
+thread starts.
+"""
+from __future__ import annotations
+
+import os
+import threading
+import weakref
+from typing import Callable, List, Optional
+
+_callbacks: List[weakref.WeakMethod] = []
+_callbacks_lock = threading.Lock()
+
+
+def register_after_fork(method: Callable[[], None]) -> None:
+    """Call the bound ``method`` in every child process forked from now on.
+
+    Only a weak reference is kept, so registering does not keep the owner alive.
+    """
+    with _callbacks_lock:
+        _callbacks.append(weakref.WeakMethod(method))
+
+
+def _after_fork_in_child() -> None:
+    global _callbacks_lock
+    # The lock may have been held by another thread of the parent at fork time.
+    _callbacks_lock = threading.Lock()
+    alive = []
+    for reference in _callbacks:
+        method = reference()
+        if method is not None:
+            method()
+            alive.append(reference)
+    _callbacks[:] = alive
+
+
+def process_id(pid: Optional[int] = None) -> str:
+    """Identify a process (by default this one) in a way that survives pid reuse.
+
+    On Linux this is ``"<pid>:<start time>"``, with the start time read from
+    /proc, so a restarted server whose workers get the same pids (as in a
+    container) is not mistaken for the old one. Elsewhere it is the pid.
+    """
+    pid = os.getpid() if pid is None else pid
+    try:
+        with open(f"/proc/{pid}/stat", "rb") as handle:
+            # The command name may contain spaces and parentheses; the start
+            # time is the 20th field after it.
+            fields = handle.read().rsplit(b")", 1)[1].split()
+        return f"{pid}:{int(fields[19])}"
+    except (OSError, IndexError, ValueError):
+        return str(pid)
+
+
+def process_running(identifier: str) -> bool:
+    """Whether the process ``process_id`` returned ``identifier`` for is still running."""
+    try:
+        pid = int(identifier.split(":", 1)[0])
+    except ValueError:
+        return False
+    if os.name == "nt":
+        # Windows servers run in one process, and os.kill(pid, 0) would
+        # send it a console event instead of probing it.
+        return pid == os.getpid()
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    except OSError:
+        return False
+    return process_id(pid) == identifier
+
+
+if hasattr(os, "register_at_fork"):  # Not available (or needed) on Windows.
+    os.register_at_fork(after_in_child=_after_fork_in_child)
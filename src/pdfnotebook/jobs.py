@@ -0,0 +1,470 @@
+"""Background work: ingestion of uploaded PDFs, tracked as jobs in SQLite, index backfills
+and the removal of deleted documents."""
+from __future__ import annotations
+
+import logging
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from .blobs import BlobStore
+from .db import (
+    JOB_DONE,
+    JOB_FAILED,
+    JOB_INDEXING,
+    JOB_SPLITTING,
+    UNFINISHED_JOB_STATES,
+    DatabaseManager,
+    Document,
+)
+from .forking import process_id, process_running, register_after_fork
+from .pdf_processor import LazyPageExtractor, count_pages, ensure_page_splits
+from .thumbnails import ThumbnailCache
+
+logger = logging.getLogger(__name__)
+
+# Progress is written to SQLite at most this often while a job is splitting.
+PROGRESS_INTERVAL = 0.5
+# Pause between search backfill batches so interactive writes interleave.
+BACKFILL_PAUSE = 0.05
+# Rows deleted per table and transaction while purging a deleted document
+# (about 15 ms of write lock each), and the pause between those batches.
+REAP_BATCH_SIZE = 1000
+REAP_PAUSE = 0.01
+# A document that fails to be removed is retried after this delay, doubled
+# on each further failure up to the maximum.
+REAP_RETRY_MIN = 30.0
+REAP_RETRY_MAX = 3600.0
+# Folders younger than this are never treated as orphans: they may belong
+# to an upload whose rows are being written right now.
+ORPHAN_GRACE = 3600.0
+
+
+class IngestQueue:
+    """Runs split-and-index jobs on a small thread pool.
+
+    Each step is idempotent and the document rows are written in the same
+    transaction that marks the job done, so a job interrupted by a restart can
+    simply be run again from the top. A job belongs to the process that
+    created or adopted it; ``resume`` adopts only jobs whose process is gone.
+    """
+
+    def __init__(
+        self,
+        db: DatabaseManager,
+        split_root: Path,
+        workers: int = 2,
+        split_workers: int = 1,
+        lazy: bool = False,
+        blobs: Optional[BlobStore] = None,
+    ) -> None:
+        self.db = db
+        self.split_root = split_root
+        # Jobs with a content hash split into (and reuse) the blob's folder.
+        self.blobs = blobs
+        self.split_workers = split_workers
+        # In lazy mode pages are extracted when first viewed, so ingestion
+        # only needs the page count.
+        self.lazy = lazy
+        self.workers = max(1, workers)
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="ingest"
+        )
+        # Jobs submitted to this process's pool and not finished yet.
+        self._queued: Set[str] = set()
+        self._queued_lock = threading.Lock()
+        register_after_fork(self._after_fork)
+
+    def _after_fork(self) -> None:
+        # The pool's threads stay behind in the parent, which keeps running
+        # the jobs it already holds; a forked worker needs a pool of its own.
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="ingest"
+        )
+        self._queued = set()
+        self._queued_lock = threading.Lock()
+
+    def submit(self, job_id: str) -> None:
+        """Queue a job on this process's pool, unless it is queued already."""
+        with self._queued_lock:
+            if job_id in self._queued:
+                return
+            self._queued.add(job_id)
+        self._executor.submit(self._run, job_id)
+
+    def resume(self) -> int:
+        """Adopt and requeue unfinished jobs whose process has exited; return how many.
+
+        Safe to run in several processes at once: each job is claimed with a
+        compare-and-set on its owner before it is queued.
+        """
+        me = process_id()
+        adopted = 0
+        for job in self.db.list_unfinished_jobs():
+            with self._queued_lock:
+                if job.job_id in self._queued:
+                    continue
+            if job.worker and job.worker != me and process_running(job.worker):
+                continue
+            if not self.db.claim_job(job.job_id, job.worker):
+                continue
+            logger.info("Resuming ingestion job %s for %s", job.job_id, job.doc_id)
+            self.submit(job.job_id)
+            adopted += 1
+        return adopted
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
+
+    def _run(self, job_id: str) -> None:
+        try:
+            self._run_job(job_id)
+        finally:
+            with self._queued_lock:
+                self._queued.discard(job_id)
+
+    def _run_job(self, job_id: str) -> None:
+        job = self.db.get_job(job_id)
+        if job is None or job.status not in UNFINISHED_JOB_STATES:
+            return
+        last_report = 0.0
+
+        def report(done: int, total: int) -> None:
+            nonlocal last_report
+            now = time.monotonic()
+            if done == total or now - last_report >= PROGRESS_INTERVAL:
+                last_report = now
+                self.db.update_job(job_id, pages_done=done, page_count=total)
+
+        content_hash = job.content_hash if self.blobs else None
+        try:
+            self.db.update_job(job_id, status=JOB_SPLITTING)
+            blob = self.db.get_blob(content_hash) if content_hash else None
+            if self.lazy and blob and blob.page_count:
+                page_count = blob.page_count
+            elif self.lazy:
+                page_count = count_pages(Path(job.source_path))
+            else:
+                # A blob split for an earlier upload passes the manifest
+                # check, so this returns at once for repeated content.
+                split_dir = (
+                    self.blobs.split_dir(content_hash)
+                    if content_hash
+                    else self.split_root / job.doc_id
+                )
+                page_count = len(
+                    ensure_page_splits(
+                        Path(job.source_path),
+                        split_dir,
+                        self.split_workers,
+                        on_progress=report,
+                    )
+                )
+            self.db.update_job(
+                job_id, status=JOB_INDEXING, pages_done=page_count, page_count=page_count
+            )
+            with self.db.transaction():
+                if content_hash:
+                    self.db.set_blob_page_count(content_hash, page_count)
+                self.db.create_document(
+                    job.doc_id, job.name, Path(job.source_path), page_count, content_hash
+                )
+                self.db.ensure_page_entries(job.doc_id, page_count)
+                self.db.update_job(job_id, status=JOB_DONE)
+            if content_hash:
+                self.blobs.link_document(job.doc_id, content_hash)
+        except Exception as exc:
+            logger.exception("Ingestion job %s failed", job_id)
+            self.db.update_job(
+                job_id, status=JOB_FAILED, error=str(exc) or exc.__class__.__name__
+            )
+            if content_hash:
+                # No document will hold the job's reference to the blob.
+                trash = self.blobs.release(content_hash)
+                if trash is not None:
+                    _remove_tree(trash)
+
+
+def backfill_search_index(db: DatabaseManager, batch_size: int = 500) -> int:
+    """Index rows that predate the full-text tables, one short batch at a time."""
+    total = 0
+    try:
+        while db.search_backfill_pending():
+            total += db.backfill_search_index(batch_size)
+            time.sleep(BACKFILL_PAUSE)
+    except Exception:
+        logger.exception("Search index backfill stopped after %d rows", total)
+        return total
+    if total:
+        logger.info("Search index backfill indexed %d rows", total)
+    return total
+
+
+class DocumentReaper:
+    """Finishes deleting documents that were tombstoned by ``mark_document_deleted``.
+
+    A delete request only writes the tombstone. ``BackgroundTasks`` then has
+    this remove the document's files and purge its rows in short
+    transactions, so neither the request nor other writers wait for a long
+    cascade. The blob and its splits are released in the transaction that
+    drops the document row, which happens at most once even if several
+    processes reap. ``sweep_orphans`` removes folders and blob files that no
+    row refers to, left behind by crashes or by page extraction racing a
+    delete.
+    """
+
+    def __init__(
+        self,
+        db: DatabaseManager,
+        blobs: BlobStore,
+        split_root: Path,
+        attachments_root: Path,
+        thumbnails: Optional[ThumbnailCache] = None,
+        extractor: Optional[LazyPageExtractor] = None,
+        batch_size: int = REAP_BATCH_SIZE,
+    ) -> None:
+        self.db = db
+        self.blobs = blobs
+        self.split_root = split_root
+        self.attachments_root = attachments_root
+        self.thumbnails = thumbnails
+        self.extractor = extractor
+        self.batch_size = batch_size
+        # doc_id -> (monotonic time of the next attempt, last delay).
+        self._retries: Dict[str, Tuple[float, float]] = {}
+
+    def reap(self, limit: int = 100) -> int:
+        """Remove up to ``limit`` tombstoned documents; return how many were removed.
+
+        A document that fails is skipped until its retry time, so it holds up
+        neither the other documents nor the loop.
+        """
+        now = time.monotonic()
+        waiting = {doc_id for doc_id, (retry_at, _) in self._retries.items() if retry_at > now}
+        documents = [
+            doc
+            for doc in self.db.list_deleted_documents(limit + len(waiting))
+            if doc.doc_id not in waiting
+        ][:limit]
+        removed = 0
+        for doc in documents:
+            try:
+                self.reap_document(doc)
+            except Exception:
+                logger.exception("Removing deleted document %s failed", doc.doc_id)
+                _, delay = self._retries.get(doc.doc_id, (0.0, REAP_RETRY_MIN / 2))
+                delay = min(delay * 2, REAP_RETRY_MAX)
+                self._retries[doc.doc_id] = (now + delay, delay)
+                continue
+            self._retries.pop(doc.doc_id, None)
+            removed += 1
+        return removed
+
+    def reap_document(self, doc: Document) -> None:
+        _remove_tree(self.attachments_root / doc.doc_id)
+        # Normally done by the delete request already.
+        self.blobs.unlink_document(doc.doc_id)
+        source = Path(doc.source_path)
+        if not doc.content_hash:
+            # Uploaded before the blob store: the files belong to this document alone.
+            self._forget(source, doc.doc_id)
+            source.unlink(missing_ok=True)
+            _remove_tree(self.blobs.trash_root / doc.doc_id)
+            _remove_tree(self.split_root / doc.doc_id)
+        while self.db.purge_document_rows(doc.doc_id, self.batch_size):
+            time.sleep(REAP_PAUSE)
+        trash = None
+        with self.db.transaction():
+            if self.db.delete_document(doc.doc_id) and doc.content_hash:
+                trash = self.blobs.release(doc.content_hash)
+        # Only now that the transaction has committed, outside the write lock.
+        if trash is not None:
+            _remove_tree(trash)
+            self._forget(source, doc.content_hash)
+        logger.info("Removed deleted document %s", doc.doc_id)
+
+    def _forget(self, source: Path, key: str) -> None:
+        if self.extractor is not None:
+            self.extractor.forget(source)
+        if self.thumbnails is not None:
+            self.thumbnails.discard(key)
+
+    def sweep_orphans(self, grace: float = ORPHAN_GRACE) -> int:
+        """Remove unreferenced split, thumbnail and attachment folders and blob files.
+
+        Anything modified within the last ``grace`` seconds is left alone.
+        """
+        cutoff = time.time() - grace
+        removed = 0
+        # Folder root -> how to remove one of its folders, named by its key.
+        roots: List[Tuple[Path, Callable[[Path], None]]] = [
+            (self.split_root, _remove_tree),
+            (self.attachments_root, _remove_tree),
+        ]
+        if self.thumbnails is not None:
+            # Through the cache, so its size accounting stays right.
+            roots.append((self.thumbnails.root, lambda path: self.thumbnails.discard(path.name)))
+        for root, remove in roots:
+            for path in _old_entries(root, cutoff):
+                # Document links in split_root may dangle once their blob is gone.
+                if (path.is_dir() or path.is_symlink()) and not self.db.storage_key_in_use(path.name):
+                    remove(path)
+                    removed += 1
+        for path in _old_entries(self.blobs.root, cutoff, "??/*.pdf"):
+            if self.db.get_blob(path.stem) is None:
+                path.unlink(missing_ok=True)
+                removed += 1
+        # Left by interrupted uploads or by a crash between a release and its clean-up.
+        for folder in (self.blobs.incoming_root, self.blobs.trash_root):
+            for path in _old_entries(folder, cutoff):
+                if path.is_dir():
+                    _remove_tree(path)
+                else:
+                    path.unlink(missing_ok=True)
+                removed += 1
+        if removed:
+            logger.info("Removed %d orphaned files and folders", removed)
+        return removed
+
+
+class MaintenanceLock:
+    """An advisory lock file held by at most one process at a time.
+
+    Once acquired it is kept until the process exits, when the OS releases
+    it. Where ``fcntl`` is unavailable (Windows, whose servers run in a
+    single process) it is always granted.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._handle = None
+        self._held = False
+        register_after_fork(self._after_fork)
+
+    def _after_fork(self) -> None:
+        # A forked child shares the parent's lock through the inherited
+        # descriptor; it must not take that for a lock of its own.
+        if self._handle is not None:
+            self._handle.close()
+        self._handle = None
+        self._held = False
+
+    def acquire(self) -> bool:
+        """Try to take the lock without blocking; True if this process holds it."""
+        if self._held:
+            return True
+        if fcntl is None:
+            self._held = True
+            return True
+        handle = self.path.open("a")
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return False
+        self._handle = handle
+        self._held = True
+        return True
+
+
+class BackgroundTasks:
+    """The background thread of one serving process.
+
+    Every process reaps deleted documents, so ``wake`` after a delete works
+    in whichever process served it. The work that must not run in several
+    processes at once, or that only needs doing once, is left to the process
+    holding ``lock``: adopting the ingestion jobs of processes that have
+    exited, the search index backfill and, every ``sweep_interval`` seconds
+    (0 turns it off), the orphan sweep. When that process exits another one
+    takes the lock over within ``interval`` seconds.
+    """
+
+    def __init__(
+        self,
+        db: DatabaseManager,
+        ingest_queue: IngestQueue,
+        reaper: DocumentReaper,
+        lock: MaintenanceLock,
+        interval: float = 5.0,
+        sweep_interval: float = 6 * 3600.0,
+    ) -> None:
+        self.db = db
+        self.ingest_queue = ingest_queue
+        self.reaper = reaper
+        self.lock = lock
+        self.interval = interval
+        self.sweep_interval = sweep_interval
+        self._wake = threading.Event()
+        self._maintaining = False
+        self._next_sweep = 0.0
+
+    def start(self) -> None:
+        threading.Thread(target=self._loop, name="background", daemon=True).start()
+
+    def wake(self) -> None:
+        """Run now instead of at the next interval."""
+        self._wake.set()
+
+    def _loop(self) -> None:
+        while True:
+            busy = False
+            try:
+                busy = self.run_once()
+            except Exception:
+                logger.exception("Background work failed; retrying later")
+            if not busy:
+                self._wake.wait(self.interval)
+                self._wake.clear()
+
+    def run_once(self, reap_limit: int = 100) -> bool:
+        """Do one round of work; True if more deleted documents may be waiting."""
+        # A full batch removed means more may be waiting: carry on at once.
+        busy = self.reaper.reap(reap_limit) == reap_limit
+        if not self.lock.acquire():
+            return busy
+        if not self._maintaining:
+            self._maintaining = True
+            logger.info("Process %d runs the shared maintenance", os.getpid())
+            self._next_sweep = time.monotonic() + self.sweep_interval
+            # Databases created before full-text search get their old rows indexed in the
+            # background; search works meanwhile and simply misses rows not reached yet.
+            if self.db.search_backfill_pending():
+                threading.Thread(
+                    target=backfill_search_index,
+                    args=(self.db,),
+                    name="search-backfill",
+                    daemon=True,
+                ).start()
+        self.ingest_queue.resume()
+        if self.sweep_interval > 0 and time.monotonic() >= self._next_sweep:
+            self._next_sweep = time.monotonic() + self.sweep_interval
+            self.reaper.sweep_orphans()
+        return busy
+
+
+def _remove_tree(path: Path) -> None:
+    if path.is_symlink():
+        path.unlink(missing_ok=True)
+    else:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def _old_entries(root: Path, cutoff: float, pattern: str = "*") -> List[Path]:
+    """Entries of ``root`` matching ``pattern``, not hidden, last modified before ``cutoff``."""
+    entries = []
+    for path in root.glob(pattern):
+        try:
+            if not path.name.startswith(".") and path.lstat().st_mtime < cutoff:
+                entries.append(path)
+        except OSError:
+            continue
+    return entries
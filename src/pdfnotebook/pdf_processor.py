@@ -1,42 +1,493 @@
 """Helpers that split PDF files into per-page neighbors."""
 from __future__ import annotations
 
+import json
+import logging
+import math
+import multiprocessing
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import List
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
 
 from PyPDF2 import PdfReader, PdfWriter
+from PyPDF2.generic import DictionaryObject, NameObject
 
+from .forking import register_after_fork
 
-def split_pdf_by_page(source: Path, destination: Path) -> List[Path]:
-    """Extract each page of ``source`` into ``destination``."""
-    reader = PdfReader(source)
-    destination.mkdir(parents=True, exist_ok=True)
-    page_paths: List[Path] = []
+logger = logging.getLogger(__name__)
+
+# Resource categories whose entries are looked up by name from the content stream.
+NAMED_RESOURCES = (
+    "/ColorSpace",
+    "/ExtGState",
+    "/Font",
+    "/Pattern",
+    "/Properties",
+    "/Shading",
+    "/XObject",
+)
+NAME_TOKEN = re.compile(rb"/([^\s/\[\]()<>{}%]+)")
+PAGE_FILE = re.compile(r"^page_(\d+)\.pdf$")
+# Starting a worker costs more than splitting a handful of pages, so shards
+# never get smaller than this.
+MIN_PAGES_PER_WORKER = 25
+
+ProgressCallback = Callable[[int, int], None]
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+
+@dataclass
+class SplitResult:
+    """The page files produced by a split plus throughput figures."""
+
+    page_paths: List[Path] = field(default_factory=list)
+    page_sizes: List[int] = field(default_factory=list)
+    bytes_written: int = 0
+    seconds: float = 0.0
+
+    def add(self, page_file: Path, size: int) -> None:
+        self.page_paths.append(page_file)
+        self.page_sizes.append(size)
+        self.bytes_written += size
+
+    @property
+    def pages_per_second(self) -> float:
+        return len(self.page_paths) / self.seconds if self.seconds else 0.0
+
+
+def page_filename(page_number: int) -> str:
+    """Return the split file name for a 1-based page number."""
+    return f"page_{page_number:03}.pdf"
+
+
+def _content_names(page: DictionaryObject) -> Optional[Set[str]]:
+    """Collect every ``/Name`` token in the page content, or ``None`` if unreadable."""
+    contents = page.get("/Contents")
+    if contents is None:
+        return set()
+    try:
+        contents = contents.get_object()
+        streams = contents if isinstance(contents, list) else [contents]
+        data = b"\n".join(stream.get_object().get_data() for stream in streams)
+    except Exception:
+        return None
+    return {
+        "/" + re.sub(rb"#([0-9A-Fa-f]{2})", lambda m: bytes([int(m.group(1), 16)]), token).decode(
+            "latin-1"
+        )
+        for token in NAME_TOKEN.findall(data)
+    }
+
+
+def _pruned_resources(page: DictionaryObject) -> Optional[DictionaryObject]:
+    """Return a copy of the page resources holding only what its content uses.
+
+    Many PDFs hang one resource dictionary listing every font and image off the
+    page tree, so a naive split copies all of them into every page file. The
+    copy keeps references to the original objects, so nothing is duplicated in
+    memory. ``None`` means the resources should be left alone.
+    """
+    resources = page.get("/Resources")
+    if resources is None:
+        return None
+    resources = resources.get_object()
+    names = _content_names(page)
+    if names is None:
+        return None
 
-    for index, page in enumerate(reader.pages):
-        writer = PdfWriter()
+    pruned = DictionaryObject()
+    changed = False
+    for category, entries in resources.items():
+        entries = entries.get_object()
+        if category not in NAMED_RESOURCES or not isinstance(entries, DictionaryObject):
+            pruned[NameObject(category)] = resources.raw_get(category)
+            continue
+        kept = DictionaryObject()
+        for name in entries:
+            if name not in names:
+                changed = True
+                continue
+            value = entries[name]
+            # Legacy form XObjects without their own resources draw from the
+            # page's, so pruning could strip something they need.
+            if (
+                category == "/XObject"
+                and value.get("/Subtype") == "/Form"
+                and "/Resources" not in value
+            ):
+                return None
+            kept[NameObject(name)] = entries.raw_get(name)
+        pruned[NameObject(category)] = kept
+    return pruned if changed else None
+
+
+def _write_page(reader: PdfReader, index: int, destination: Path) -> Tuple[Path, int]:
+    """Write page ``index`` of ``reader`` as its own PDF and return its path and size."""
+    page = reader.pages[index]
+    original = page.raw_get("/Resources") if "/Resources" in page else None
+    pruned = _pruned_resources(page)
+    writer = PdfWriter()
+    if pruned is not None:
+        page[NameObject("/Resources")] = pruned
+    try:
         writer.add_page(page)
-        page_file = destination / f"page_{index + 1:03}.pdf"
-        with page_file.open("wb") as output_file:
-            writer.write(output_file)
-        page_paths.append(page_file)
+    finally:
+        if pruned is not None:
+            page[NameObject("/Resources")] = original
+    page_file = destination / page_filename(index + 1)
+    # Write under a private name and rename so concurrent extractions of the
+    # same page never expose a half-written file.
+    partial = destination / f".{page_file.name}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with partial.open("wb") as output_file:
+        writer.write(output_file)
+        size = output_file.tell()
+    os.replace(partial, page_file)
+    return page_file, size
 
-    return page_paths
+
+def iter_split_pages(
+    reader: PdfReader, destination: Path, indexes: Iterable[int]
+) -> Iterator[Tuple[Path, int]]:
+    """Write the requested pages one at a time, yielding each path and size.
+
+    Only one writer is alive at a time and the reader's resolved-object cache
+    is dropped after every page, so memory stays flat on long documents.
+    """
+    for index in indexes:
+        yield _write_page(reader, index, destination)
+        reader.resolved_objects.clear()
+
+
+def _split_range(source: Path, destination: Path, start: int, stop: int) -> List[Tuple[Path, int]]:
+    """Process-pool entry point: split pages ``start`` to ``stop`` with a private reader."""
+    with source.open("rb") as handle:
+        reader = PdfReader(handle)
+        return list(iter_split_pages(reader, destination, range(start, stop)))
+
+
+def _pool_context() -> multiprocessing.context.BaseContext:
+    """Start pool workers without ``fork``: the server process runs threads."""
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+def _shards(page_count: int, workers: int) -> List[Tuple[int, int]]:
+    """Cut ``range(page_count)`` into ``workers`` contiguous, near-equal ranges."""
+    size = math.ceil(page_count / workers)
+    return [(start, min(start + size, page_count)) for start in range(0, page_count, size)]
+
+
+def split_pdf(
+    source: Path,
+    destination: Path,
+    workers: int = 1,
+    on_progress: Optional[ProgressCallback] = None,
+) -> SplitResult:
+    """Split ``source`` into ``destination`` and report throughput.
+
+    With ``workers > 1`` contiguous page ranges are split in parallel
+    processes, each opening its own reader; the files are byte-identical to
+    the serial path. ``on_progress`` receives ``(pages_done, page_count)``
+    after every page (serial) or finished shard (parallel).
+
+    Readers are opened on a file handle, so objects are read from disk as
+    pages need them instead of the whole file being loaded into memory, and
+    the parent holds no reader while the workers run.
+    """
+    start = time.perf_counter()
+    page_count = count_pages(source)
+    destination.mkdir(parents=True, exist_ok=True)
+    workers = max(1, min(workers, math.ceil(page_count / MIN_PAGES_PER_WORKER)))
+    result = SplitResult()
+
+    if workers == 1:
+        with source.open("rb") as handle:
+            reader = PdfReader(handle)
+            for page_file, size in iter_split_pages(reader, destination, range(page_count)):
+                result.add(page_file, size)
+                if on_progress:
+                    on_progress(len(result.page_paths), page_count)
+    else:
+        shards: Dict[int, List[Tuple[Path, int]]] = {}
+        with ProcessPoolExecutor(max_workers=workers, mp_context=_pool_context()) as pool:
+            futures = {
+                pool.submit(_split_range, source, destination, first, last): first
+                for first, last in _shards(page_count, workers)
+            }
+            done = 0
+            for future in as_completed(futures):
+                shards[futures[future]] = future.result()
+                done += len(shards[futures[future]])
+                if on_progress:
+                    on_progress(done, page_count)
+        for first in sorted(shards):
+            for page_file, size in shards[first]:
+                result.add(page_file, size)
+
+    result.seconds = time.perf_counter() - start
+    logger.info(
+        "Split %s into %d pages with %d worker(s) (%.1f pages/s, %d bytes written)",
+        source.name,
+        len(result.page_paths),
+        workers,
+        result.pages_per_second,
+        result.bytes_written,
+    )
+    return result
+
+
+def split_pdf_by_page(
+    source: Path,
+    destination: Path,
+    workers: int = 1,
+    on_progress: Optional[ProgressCallback] = None,
+) -> List[Path]:
+    """Extract each page of ``source`` into ``destination``."""
+    return split_pdf(source, destination, workers, on_progress).page_paths
+
+
+def count_pages(source: Path) -> int:
+    """Return the number of pages in ``source`` without splitting or loading it."""
+    with source.open("rb") as handle:
+        return len(PdfReader(handle).pages)
+
+
+class LazyPageExtractor:
+    """Extract single pages from source PDFs on demand and cache them on disk.
+
+    Parsed readers for recently used sources are kept in a small LRU so that
+    paging through a document does not re-parse its cross-reference table on
+    every request. Each reader works from an open file handle, so a cached
+    reader holds the cross-reference table rather than the whole file.
+    Readers are not thread-safe, so each has its own lock.
+    """
+
+    def __init__(self, max_readers: int = 4, prefetch: int = 2, workers: int = 1) -> None:
+        self.max_readers = max_readers
+        self.prefetch_pages = prefetch
+        self._readers: "OrderedDict[Path, Tuple[PdfReader, threading.Lock, BinaryIO]]" = (
+            OrderedDict()
+        )
+        self._readers_lock = threading.Lock()
+        self._pending: Set[Path] = set()
+        self.workers = max(1, workers)
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="prefetch"
+        )
+        register_after_fork(self._after_fork)
+
+    def _after_fork(self) -> None:
+        # Prefetch threads and reader locks belong to the parent process, and
+        # the file handles share their offsets with it.
+        self._readers = OrderedDict()
+        self._readers_lock = threading.Lock()
+        self._pending = set()
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="prefetch"
+        )
+
+    def _reader(self, source: Path) -> Tuple[PdfReader, threading.Lock, BinaryIO]:
+        evicted = []
+        with self._readers_lock:
+            entry = self._readers.get(source)
+            if entry is None:
+                handle = source.open("rb")
+                try:
+                    entry = (PdfReader(handle), threading.Lock(), handle)
+                except Exception:
+                    handle.close()
+                    raise
+                self._readers[source] = entry
+                while len(self._readers) > self.max_readers:
+                    evicted.append(self._readers.popitem(last=False)[1])
+            else:
+                self._readers.move_to_end(source)
+        for old in evicted:
+            self._close(old)
+        return entry
+
+    @staticmethod
+    def _close(entry: Tuple[PdfReader, threading.Lock, BinaryIO]) -> None:
+        # Waits for an extraction still using the reader.
+        _, lock, handle = entry
+        with lock:
+            handle.close()
+
+    def extract(self, source: Path, destination: Path, page_number: int) -> Optional[Path]:
+        """Return the cached page file, extracting it first if needed.
+
+        ``None`` means the page does not exist in ``source``.
+        """
+        page_file = destination / page_filename(page_number)
+        while not page_file.exists():
+            reader, lock, handle = self._reader(source)
+            with lock:
+                if handle.closed:
+                    # Evicted between the lookup and the lock; open it again.
+                    continue
+                if page_file.exists():
+                    break
+                if not 1 <= page_number <= len(reader.pages):
+                    return None
+                destination.mkdir(parents=True, exist_ok=True)
+                _write_page(reader, page_number - 1, destination)
+                reader.resolved_objects.clear()
+        return page_file
+
+    def _neighbours(self, page_number: int) -> List[int]:
+        """The page before ``page_number`` and the ``prefetch_pages`` after it."""
+        candidates = [page_number - 1] + [
+            page_number + offset for offset in range(1, self.prefetch_pages + 1)
+        ]
+        return [candidate for candidate in candidates if candidate >= 1]
+
+    def needs_prefetch(self, destination: Path, page_number: int) -> bool:
+        """Whether any neighbour of ``page_number`` is not cached yet."""
+        return any(
+            not (destination / page_filename(neighbour)).exists()
+            for neighbour in self._neighbours(page_number)
+        )
+
+    def prefetch(self, source: Path, destination: Path, page_number: int) -> None:
+        """Queue extraction of the pages around ``page_number`` that are not cached."""
+        for neighbour in self._neighbours(page_number):
+            page_file = destination / page_filename(neighbour)
+            if page_file.exists():
+                continue
+            with self._readers_lock:
+                if page_file in self._pending:
+                    continue
+                self._pending.add(page_file)
+            self._executor.submit(self._prefetch_one, source, destination, neighbour)
+
+    def _prefetch_one(self, source: Path, destination: Path, page_number: int) -> None:
+        try:
+            self.extract(source, destination, page_number)
+        except Exception:
+            logger.exception("Prefetching page %d of %s failed", page_number, source.name)
+        finally:
+            with self._readers_lock:
+                self._pending.discard(destination / page_filename(page_number))
+
+    def forget(self, source: Path) -> None:
+        """Drop the cached reader for ``source`` (e.g. when it is deleted)."""
+        with self._readers_lock:
+            entry = self._readers.pop(source, None)
+        if entry is not None:
+            self._close(entry)
 
 
 def find_pages(destination: Path) -> List[Path]:
-    """Return the individual page PDFs in alphabetical order."""
-    return sorted(destination.glob("page_*.pdf"))
+    """Return the individual page PDFs in page order.
+
+    Names are zero-padded to three digits only, so ``page_1000.pdf`` would
+    sort before ``page_101.pdf`` alphabetically.
+    """
+    numbered = []
+    for page_file in destination.glob("page_*.pdf"):
+        match = PAGE_FILE.match(page_file.name)
+        if match:
+            numbered.append((int(match.group(1)), page_file))
+    return [page_file for _, page_file in sorted(numbered)]
+
+
+def _source_fingerprint(source: Path) -> Dict[str, int]:
+    stat = source.stat()
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def write_manifest(source: Path, destination: Path, page_sizes: List[int]) -> None:
+    """Record what ``destination`` was split from so it can be validated cheaply."""
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "source": _source_fingerprint(source),
+        "page_count": len(page_sizes),
+        "pages": {
+            page_filename(number): size for number, size in enumerate(page_sizes, start=1)
+        },
+    }
+    partial = destination / f".{MANIFEST_NAME}.{os.getpid()}.{threading.get_ident()}.tmp"
+    partial.write_text(json.dumps(manifest, indent=2))
+    os.replace(partial, destination / MANIFEST_NAME)
+
+
+def load_manifest(destination: Path) -> Optional[Dict[str, Any]]:
+    """Return the split manifest for ``destination`` if it is present and readable."""
+    try:
+        manifest = json.loads((destination / MANIFEST_NAME).read_text())
+    except (OSError, ValueError):
+        return None
+    if not isinstance(manifest, dict) or manifest.get("version") != MANIFEST_VERSION:
+        return None
+    return manifest
+
+
+def _manifest_pages(source: Path, destination: Path) -> Optional[List[Path]]:
+    """Return the split pages if the manifest still describes them, else ``None``.
+
+    This costs a JSON read and one ``stat`` per file, instead of re-parsing
+    the source PDF.
+    """
+    manifest = load_manifest(destination)
+    if manifest is None or manifest.get("source") != _source_fingerprint(source):
+        return None
+    pages = manifest.get("pages", {})
+    if len(pages) != manifest.get("page_count"):
+        return None
+    page_paths = []
+    for number in range(1, len(pages) + 1):
+        page_file = destination / page_filename(number)
+        try:
+            if page_file.stat().st_size != pages.get(page_file.name):
+                return None
+        except OSError:
+            return None
+        page_paths.append(page_file)
+    return page_paths
 
 
-def ensure_page_splits(source: Path, destination: Path) -> List[Path]:
-    """Create per-page PDFs in ``destination`` (rebuilding if the count changes)."""
-    if not destination.exists():
-        return split_pdf_by_page(source, destination)
+def ensure_page_splits(
+    source: Path,
+    destination: Path,
+    workers: int = 1,
+    on_progress: Optional[ProgressCallback] = None,
+) -> List[Path]:
+    """Create per-page PDFs in ``destination``, rebuilding them if they are stale.
 
-    reader = PdfReader(source)
-    existing_pages = find_pages(destination)
-    if len(existing_pages) != len(reader.pages):
-        return split_pdf_by_page(source, destination)
+    Splits are checked against the manifest written next to them. Directories
+    from before manifests existed are adopted if their page count still
+    matches the source.
+    """
+    if destination.exists():
+        page_paths = _manifest_pages(source, destination)
+        if page_paths is not None:
+            return page_paths
+        if load_manifest(destination) is None:
+            existing_pages = find_pages(destination)
+            # The manifest records sizes by position, so the files must be
+            # exactly pages 1..n.
+            numbered = all(
+                page.name == page_filename(number)
+                for number, page in enumerate(existing_pages, start=1)
+            )
+            if existing_pages and numbered and len(existing_pages) == count_pages(source):
+                write_manifest(
+                    source, destination, [page.stat().st_size for page in existing_pages]
+                )
+                return existing_pages
 
-    return existing_pages
+    result = split_pdf(source, destination, workers, on_progress)
+    expected = set(result.page_paths)
+    for stale in find_pages(destination):
+        if stale not in expected:
+            stale.unlink()
+    write_manifest(source, destination, result.page_sizes)
+    return result.page_paths
@@ -0,0 +1,113 @@
+"""Serve the Flask app with the development server or a production WSGI server.
+
+``gunicorn`` (Linux/macOS) imports the app once in a master process and forks
+``workers`` processes that each handle ``threads`` requests at a time. Send
+the master SIGHUP to replace the workers gracefully: new ones start before
+the old ones finish their requests and exit. ``waitress`` also runs on
+Windows but serves from a single process with ``threads`` threads. ``dev`` is
+Werkzeug's development server. Neither production server is a hard
+dependency; install the one you use.
+
+``on_start`` is called in every process that serves requests before it
+serves the first one: in each gunicorn worker right after it is forked, and
+in the serving process itself otherwise. The gunicorn master only runs what
+the caller did before ``serve``, so nothing it holds is copied into workers.
+"""
+from __future__ import annotations
+
+import logging
+import os
+from typing import Any, Callable, Dict, Optional
+
+from flask import Flask
+
+logger = logging.getLogger(__name__)
+
+SERVERS = ("dev", "gunicorn", "waitress")
+DEFAULT_THREADS = 4
+# How long a worker may take to finish its requests on reload or shutdown.
+DEFAULT_GRACEFUL_TIMEOUT = 30
+
+
+def default_workers() -> int:
+    return os.cpu_count() or 1
+
+
+def serve(
+    app: Flask,
+    host: str,
+    port: int,
+    server: str = "dev",
+    workers: int = 0,
+    threads: int = DEFAULT_THREADS,
+    graceful_timeout: int = DEFAULT_GRACEFUL_TIMEOUT,
+    on_start: Optional[Callable[[], None]] = None,
+) -> None:
+    """Run ``app`` until interrupted; ``workers=0`` means one per CPU."""
+    server = server.lower()
+    if server not in SERVERS:
+        raise ValueError(f"Unknown server {server!r}; expected one of {', '.join(SERVERS)}")
+    threads = max(1, threads)
+    if server == "gunicorn":
+        _serve_gunicorn(
+            app, host, port, workers or default_workers(), threads, graceful_timeout, on_start
+        )
+        return
+    if on_start is not None:
+        on_start()
+    if server == "waitress":
+        _serve_waitress(app, host, port, workers, threads)
+    else:
+        app.run(host=host, port=port, threaded=True)
+
+
+def _serve_gunicorn(
+    app: Flask,
+    host: str,
+    port: int,
+    workers: int,
+    threads: int,
+    graceful_timeout: int,
+    on_start: Optional[Callable[[], None]],
+) -> None:
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        raise SystemExit(
+            "PDFNOTEBOOK_SERVER=gunicorn needs gunicorn: pip install gunicorn "
+            "(on Windows use PDFNOTEBOOK_SERVER=waitress)"
+        ) from None
+
+    options: Dict[str, Any] = {
+        "bind": f"{host}:{port}",
+        "workers": workers,
+        "threads": threads,
+        "worker_class": "gthread",
+        # The app is already imported; workers are forked from it.
+        "preload_app": True,
+        "graceful_timeout": graceful_timeout,
+        "proc_name": "pdfnotebook",
+    }
+    if on_start is not None:
+        options["post_fork"] = lambda server, worker: on_start()
+
+    class Application(BaseApplication):
+        def load_config(self) -> None:
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self) -> Flask:
+            return app
+
+    logger.info("Serving with gunicorn: %d workers x %d threads", workers, threads)
+    Application().run()
+
+
+def _serve_waitress(app: Flask, host: str, port: int, workers: int, threads: int) -> None:
+    try:
+        from waitress import serve as waitress_serve
+    except ImportError:
+        raise SystemExit("PDFNOTEBOOK_SERVER=waitress needs waitress: pip install waitress") from None
+    if workers > 1:
+        logger.info("waitress serves from one process; ignoring %d workers", workers)
+    waitress_serve(app, host=host, port=port, threads=threads)
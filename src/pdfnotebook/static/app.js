@@ -1,11 +1,33 @@
+// The page list only renders the rows in view and fetches them PAGE_WINDOW
+// at a time, so large documents paint as fast as small ones.
+const PAGE_ROW_HEIGHT = 84;
+const PAGE_WINDOW = 100;
+const PAGE_OVERSCAN = 4;
+// Random snapshots are fetched as a shuffled batch and handed out one by one.
+const RANDOM_BATCH = 20;
+// Uploads go up in chunks; an interrupted one resumes from the server's
+// offset, found through the upload ID remembered per file.
+const UPLOAD_RESUME_KEY = "pdfnotebook.uploads";
+const UPLOAD_RETRIES = 5;
+// The server leaves thumbnails out when it has no PDF renderer installed.
+const THUMBNAILS_ENABLED = document.body.dataset.thumbnails === "on";
+
 const state = {
   currentDocument: null,
   docId: null,
-  pages: [],
+  pages: new Map(),
+  pageTotal: 0,
+  loadingWindows: new Set(),
+  // Thumbnail <img> elements of the rows in view, kept across renders so
+  // scrolling never requests them again, and the pages whose thumbnail failed.
+  thumbs: new Map(),
+  failedThumbs: new Set(),
+  progress: null,
   selectedPageNumber: null,
   generalMode: false,
   generalEntries: [],
   entrySnapshot: null,
+  randomEntries: [],
   previewVisible: false,
 };
 
@@ -59,6 +81,7 @@ document.addEventListener("DOMContentLoaded", () => {
   }
   elements.documentList.addEventListener("click", handleDocumentClick);
   elements.pageList.addEventListener("click", handlePageClick);
+  elements.pageList.addEventListener("scroll", schedulePageListRender, { passive: true });
   if (elements.saveAndNextPageBtn) {
     elements.saveAndNextPageBtn.addEventListener("click", handleSaveAndNextPage);
   }
@@ -145,7 +168,7 @@ async function deleteDocument(docId) {
     });
     if (state.docId === docId) {
       state.docId = null;
-      state.pages = [];
+      resetPages();
       clearPageDetails();
     }
     await loadDocuments();
@@ -175,8 +198,13 @@ async function loadEntrySnapshot(mode) {
     return;
   }
   try {
-    const payload = await fetchJson(`/api/entry/${mode}/${state.docId}`);
-    state.entrySnapshot = payload.entry;
+    if (mode === "random") {
+      state.entrySnapshot = await nextRandomEntry();
+      if (!state.entrySnapshot) throw new Error("No page entries available.");
+    } else {
+      const payload = await fetchJson(`/api/entry/${mode}/${state.docId}`);
+      state.entrySnapshot = payload.entry;
+    }
     renderEntrySnapshot(`Showing ${mode} entry`);
   } catch (exc) {
     showStatus(exc.message, "error");
@@ -185,6 +213,16 @@ async function loadEntrySnapshot(mode) {
   }
 }
 
+async function nextRandomEntry() {
+  if (!state.randomEntries.length) {
+    const payload = await fetchJson(
+      `/api/entry/random/${state.docId}?count=${RANDOM_BATCH}`
+    );
+    state.randomEntries = payload.entries;
+  }
+  return state.randomEntries.shift() || null;
+}
+
 function renderDocList(docs) {
   if (!elements.documentList) return;
   elements.documentList.innerHTML = "";
@@ -276,18 +314,24 @@ async function selectDocument(docId) {
   updateWorkspaceVisibility();
   showUploadSection(false);
   try {
-    const payload = await fetchJson(`/api/pages/${docId}`);
+    const payload = await fetchJson(`/api/pages/${docId}?limit=${PAGE_WINDOW}`);
     state.currentDocument = payload.document;
-    state.pages = payload.pages;
+    resetPages();
+    storePages(payload.pages);
+    state.loadingWindows.add(0);
+    state.progress = payload.progress;
+    state.pageTotal = payload.progress.total;
     elements.currentDocName.textContent = `${payload.document.name} (${payload.document.page_count} pages)`;
+    elements.pageList.scrollTop = 0;
     renderPageList();
-    if (state.pages.length) {
-      await selectPage(state.pages[0].page_number);
+    if (payload.pages.length) {
+      await selectPage(payload.pages[0].page_number);
     } else {
       clearPageDetails();
     }
     await loadGeneralEntries();
     state.entrySnapshot = null;
+    state.randomEntries = [];
     renderEntrySnapshot("Entry preview");
     if (elements.documentSelect) {
       elements.documentSelect.value = docId;
@@ -297,54 +341,170 @@ async function selectDocument(docId) {
   }
 }
 
-function renderPageList() {
-  if (!state.pages.length) {
-    elements.pageList.innerHTML =
-      "<p class='empty'>Upload a document to list pages.</p>";
-    updateProgressBar();
-    return;
+function resetPages() {
+  state.pages = new Map();
+  state.pageTotal = 0;
+  state.loadingWindows = new Set();
+  state.thumbs = new Map();
+  state.failedThumbs = new Set();
+}
+
+function storePages(pages) {
+  pages.forEach((page) => state.pages.set(page.page_number, page));
+}
+
+async function loadPageWindow(windowIndex) {
+  const docId = state.docId;
+  if (!docId || state.loadingWindows.has(windowIndex)) return;
+  state.loadingWindows.add(windowIndex);
+  try {
+    const payload = await fetchJson(
+      `/api/pages/${docId}?after_page=${windowIndex * PAGE_WINDOW}&limit=${PAGE_WINDOW}`
+    );
+    if (state.docId !== docId) return;
+    storePages(payload.pages);
+    state.progress = payload.progress;
+    renderPageList();
+  } catch (exc) {
+    state.loadingWindows.delete(windowIndex);
+    showStatus(exc.message, "error");
   }
-  elements.pageList.innerHTML = "";
-  state.pages.forEach((page) => {
-    const item = document.createElement("button");
-    item.type = "button";
-    const classes = ["page-item"];
-    if (state.selectedPageNumber === page.page_number) {
-      classes.push("active");
-    }
-    if (page.skipped) {
-      classes.push("skipped");
-    }
-    item.className = classes.join(" ");
-    item.dataset.pageNumber = page.page_number;
+}
+
+let pageListFrame = null;
+
+function schedulePageListRender() {
+  if (pageListFrame !== null) return;
+  pageListFrame = requestAnimationFrame(() => {
+    pageListFrame = null;
+    renderPageList();
+  });
+}
+
+function visiblePageRange() {
+  const first = Math.floor(elements.pageList.scrollTop / PAGE_ROW_HEIGHT) - PAGE_OVERSCAN;
+  const count = Math.ceil(elements.pageList.clientHeight / PAGE_ROW_HEIGHT) + PAGE_OVERSCAN * 2;
+  return [Math.max(1, first + 1), Math.min(state.pageTotal, first + count)];
+}
+
+function pageThumb(pageNumber) {
+  if (!THUMBNAILS_ENABLED || state.failedThumbs.has(pageNumber)) return null;
+  let img = state.thumbs.get(pageNumber);
+  if (!img) {
+    const docId = state.docId;
+    img = document.createElement("img");
+    img.className = "page-thumb";
+    img.loading = "lazy";
+    img.alt = "";
+    img.addEventListener("error", () => {
+      img.remove();
+      if (state.docId !== docId) return;
+      state.thumbs.delete(pageNumber);
+      state.failedThumbs.add(pageNumber);
+    });
+    img.src = `/thumbs/${docId}/${pageNumber}.png`;
+    state.thumbs.set(pageNumber, img);
+  }
+  return img;
+}
+
+function renderPageRow(pageNumber) {
+  const page = state.pages.get(pageNumber);
+  const item = document.createElement("button");
+  item.type = "button";
+  const classes = ["page-item"];
+  if (state.selectedPageNumber === pageNumber) {
+    classes.push("active");
+  }
+  if (page && page.skipped) {
+    classes.push("skipped");
+  }
+  item.className = classes.join(" ");
+  item.dataset.pageNumber = pageNumber;
+  item.style.top = `${(pageNumber - 1) * PAGE_ROW_HEIGHT}px`;
+  let statusText = "Loading…";
+  let countText = "";
+  if (page) {
     const statuses = [];
     if (page.complete) statuses.push("✓ complete");
     if (page.ignored) statuses.push("Ignored");
     if (page.skipped) statuses.push("Skipped");
-    const statusText = statuses.length ? statuses.join(" • ") : "Pending";
-    item.innerHTML = `
+    statusText = statuses.length ? statuses.join(" • ") : "Pending";
+    countText = `${page.entry_count} ${page.entry_count === 1 ? "entry" : "entries"}`;
+  }
+  item.innerHTML = `
+    <div class="page-label">
       <div>
-        <span class="page-number">Page ${page.page_number}</span>
+        <span class="page-number">Page ${pageNumber}</span>
         <span class="page-status">${statusText}</span>
       </div>
-      <div class="page-entry-count">${page.entry_count} ${page.entry_count === 1 ? "entry" : "entries"}</div>
-    `;
-    elements.pageList.appendChild(item);
-  });
+    </div>
+    <div class="page-entry-count">${countText}</div>
+  `;
+  const thumb = pageThumb(pageNumber);
+  if (thumb) {
+    item.querySelector(".page-label").prepend(thumb);
+  }
+  return item;
+}
+
+function renderPageList() {
+  if (!state.pageTotal) {
+    elements.pageList.innerHTML =
+      "<p class='empty'>Upload a document to list pages.</p>";
+    updateProgressBar();
+    return;
+  }
+  const [first, last] = visiblePageRange();
+  const windowEl = document.createElement("div");
+  windowEl.className = "page-window";
+  windowEl.style.height = `${state.pageTotal * PAGE_ROW_HEIGHT}px`;
+  for (let pageNumber = first; pageNumber <= last; pageNumber += 1) {
+    windowEl.appendChild(renderPageRow(pageNumber));
+    if (!state.pages.has(pageNumber)) {
+      loadPageWindow(Math.floor((pageNumber - 1) / PAGE_WINDOW));
+    }
+  }
+  elements.pageList.replaceChildren(windowEl);
+  for (const pageNumber of state.thumbs.keys()) {
+    if (pageNumber < first || pageNumber > last) {
+      state.thumbs.delete(pageNumber);
+    }
+  }
   updateProgressBar();
 }
 
+function scrollPageIntoView(pageNumber) {
+  const top = (pageNumber - 1) * PAGE_ROW_HEIGHT;
+  const list = elements.pageList;
+  if (top < list.scrollTop) {
+    list.scrollTop = top;
+  } else if (top + PAGE_ROW_HEIGHT > list.scrollTop + list.clientHeight) {
+    list.scrollTop = top + PAGE_ROW_HEIGHT - list.clientHeight;
+  }
+}
+
+async function refreshProgress() {
+  if (!state.docId) return;
+  try {
+    const payload = await fetchJson(`/api/status/${state.docId}`);
+    state.progress = payload.progress;
+    updateProgressBar();
+  } catch (exc) {
+    showStatus(exc.message, "error");
+  }
+}
+
 function updateProgressBar() {
   if (!elements.progressComplete || !elements.progressSkipped || !elements.progressLabel) return;
-  const total = state.pages.length;
+  const total = state.progress ? state.progress.total : 0;
   if (!total) {
     elements.progressComplete.style.width = "0%";
     elements.progressSkipped.style.width = "0%";
     elements.progressLabel.textContent = "No pages loaded";
     return;
   }
-  const completed = state.pages.filter((page) => page.complete).length;
-  const skipped = state.pages.filter((page) => page.skipped && !page.complete).length;
+  const { complete: completed, skipped } = state.progress;
   const completePct = ((completed / total) * 100).toFixed(1);
   const skippedPct = ((skipped / total) * 100).toFixed(1);
   elements.progressComplete.style.width = `${completePct}%`;
@@ -363,7 +523,7 @@ function handlePageClick(event) {
 async function selectPage(pageNumber) {
   if (!state.docId) return;
   state.selectedPageNumber = pageNumber;
-  if (!state.pages.length) return;
+  if (!state.pageTotal) return;
   try {
     const payload = await fetchJson(`/api/pages/${state.docId}/${pageNumber}`);
     const page = payload.page;
@@ -372,14 +532,15 @@ async function selectPage(pageNumber) {
     elements.outputInput.value = page.output;
     elements.tagsInput.value = page.tags || "";
     elements.pageHeading.textContent = `Page ${page.page_number}`;
-    const selectedPage = state.pages.find((p) => p.page_number === pageNumber);
-    const entryTotal = selectedPage ? selectedPage.entry_count : 0;
+    const selectedPage = state.pages.get(pageNumber);
+    const entryTotal = page.entry_count;
     elements.entryCount.textContent = `${entryTotal} ${
       entryTotal === 1 ? "entry" : "entries"
     }`;
     if (selectedPage) {
       selectedPage.complete = page.complete;
       selectedPage.ignored = page.ignored;
+      selectedPage.entry_count = page.entry_count;
     }
     if (elements.saveAndNextPageBtn) {
       elements.saveAndNextPageBtn.disabled = false;
@@ -392,6 +553,7 @@ async function selectPage(pageNumber) {
     }
     elements.downloadPageBtn.disabled = false;
     updatePagePreview(pageNumber);
+    scrollPageIntoView(pageNumber);
     renderPageList();
   } catch (exc) {
     showStatus(exc.message, "error");
@@ -458,34 +620,121 @@ function clearPageDetails() {
 
 async function handleUpload(event) {
   event.preventDefault();
-  const formData = new FormData();
   if (!elements.uploadFile.files.length) {
     showStatus("Select a PDF before uploading.", "error");
     return;
   }
-  formData.append("file", elements.uploadFile.files[0]);
-  if (elements.uploadName.value) {
-    formData.append("name", elements.uploadName.value);
-  }
   try {
-    const response = await fetch("/api/documents", {
-      method: "POST",
-      body: formData,
-    });
-    const payload = await response.json();
-    if (!response.ok) {
-      throw new Error(payload.error || "Upload failed.");
-    }
-    state.docId = payload.doc_id;
-    showStatus("PDF uploaded and split successfully.", "success");
+    const payload = await uploadInChunks(
+      elements.uploadFile.files[0],
+      elements.uploadName.value
+    );
     elements.uploadFile.value = "";
     elements.uploadName.value = "";
+    showStatus("PDF uploaded. Splitting pages…", "info", true);
+    await waitForJob(payload.job_id);
+    state.docId = payload.doc_id;
+    showStatus("PDF uploaded and split successfully.", "success");
     await loadDocuments();
   } catch (exc) {
     showStatus(exc.message, "error");
   }
 }
 
+function loadResumableUploads() {
+  try {
+    return JSON.parse(localStorage.getItem(UPLOAD_RESUME_KEY)) || {};
+  } catch {
+    return {};
+  }
+}
+
+function rememberUpload(key, uploadId) {
+  const uploads = loadResumableUploads();
+  if (uploadId) {
+    uploads[key] = uploadId;
+  } else {
+    delete uploads[key];
+  }
+  localStorage.setItem(UPLOAD_RESUME_KEY, JSON.stringify(uploads));
+}
+
+async function sha256Hex(blob) {
+  // crypto.subtle only exists on secure origins (HTTPS or localhost).
+  if (!window.crypto?.subtle) {
+    return null;
+  }
+  const digest = await crypto.subtle.digest("SHA-256", await blob.arrayBuffer());
+  return Array.from(new Uint8Array(digest), (byte) => byte.toString(16).padStart(2, "0")).join("");
+}
+
+async function uploadInChunks(file, name) {
+  const key = `${file.name}:${file.size}:${file.lastModified}`;
+  const savedId = loadResumableUploads()[key];
+  let upload = null;
+  if (savedId) {
+    upload = await fetchJson(`/api/uploads/${savedId}`).catch(() => null);
+  }
+  if (!upload) {
+    upload = await fetchJson("/api/uploads", {
+      method: "POST",
+      body: JSON.stringify({ filename: file.name, name: name || undefined, size: file.size }),
+    });
+    rememberUpload(key, upload.id);
+  }
+  while (upload.received < file.size) {
+    const offset = upload.received;
+    const chunk = file.slice(offset, offset + upload.chunk_size);
+    const headers = { "Content-Type": "application/octet-stream" };
+    const digest = await sha256Hex(chunk);
+    if (digest) {
+      headers["X-Chunk-Sha256"] = digest;
+    }
+    for (let attempt = 1; ; attempt += 1) {
+      try {
+        upload = await fetchJson(`/api/uploads/${upload.id}?offset=${offset}`, {
+          method: "PUT",
+          headers,
+          body: chunk,
+        });
+        break;
+      } catch (exc) {
+        if (attempt >= UPLOAD_RETRIES) {
+          throw exc;
+        }
+        await new Promise((resolve) => setTimeout(resolve, attempt * 1000));
+        // The chunk may have landed before the connection dropped.
+        upload = await fetchJson(`/api/uploads/${upload.id}`).catch(() => upload);
+        if (upload.received !== offset) {
+          break;
+        }
+      }
+    }
+    const percent = Math.floor((upload.received / file.size) * 100);
+    showStatus(`Uploading PDF (${percent}%)…`, "info", true);
+  }
+  const result = await fetchJson(`/api/uploads/${upload.id}/finalize`, { method: "POST" });
+  rememberUpload(key, null);
+  return result;
+}
+
+async function waitForJob(jobId, interval = 1000) {
+  for (;;) {
+    const { job } = await fetchJson(`/api/jobs/${jobId}`);
+    if (job.status === "done") {
+      return job;
+    }
+    if (job.status === "failed") {
+      throw new Error(job.error || "Processing the PDF failed.");
+    }
+    const progress = job.page_count
+      ? `${job.pages_done}/${job.page_count} pages`
+      : job.status;
+    showStatus(`Processing PDF (${progress})…`, "info", true);
+    await new Promise((resolve) => setTimeout(resolve, interval));
+  }
+}
+
 async function handleSaveAndNextPage() {
   if (!state.docId || !state.selectedPageNumber) {
     showStatus("Pick a document and page first.", "error");
@@ -505,7 +754,7 @@ async function handleSaveAndNextEntry() {
 }
 
 async function persistEntry() {
-  const page = state.pages.find((p) => p.page_number === state.selectedPageNumber);
+  const page = state.pages.get(state.selectedPageNumber);
   const payload = {
     doc_id: state.docId,
     page_number: state.selectedPageNumber,
@@ -520,13 +769,14 @@ async function persistEntry() {
       method: "POST",
       body: JSON.stringify(payload),
     });
-    const page = state.pages.find((p) => p.page_number === state.selectedPageNumber);
+    const page = state.pages.get(state.selectedPageNumber);
     if (page) {
       page.entry_count = response.entry_count;
       page.complete = payload.complete;
     }
     renderPageList();
     await selectPage(state.selectedPageNumber);
+    await refreshProgress();
     showStatus(`Saved entry ${response.entry_count} for page ${state.selectedPageNumber}.`, "success");
   } catch (exc) {
     showStatus(exc.message, "error");
@@ -545,9 +795,7 @@ async function handleSkip() {
     return;
   }
   try {
-    const page = state.pages.find(
-      (p) => p.page_number === state.selectedPageNumber
-    );
+    const page = state.pages.get(state.selectedPageNumber);
     const nextState = page ? !page.skipped : true;
     const response = await fetchJson("/api/skip", {
       method: "POST",
@@ -561,6 +809,7 @@ async function handleSkip() {
       page.skipped = response.skipped;
     }
     renderPageList();
+    await refreshProgress();
     showStatus(
       `Page ${state.selectedPageNumber} ${response.skipped ? "skipped" : "unskipped"}.`,
       "info"
@@ -571,12 +820,11 @@ async function handleSkip() {
 }
 
 function moveToNextPage() {
-  const index = state.pages.findIndex((p) => p.page_number === state.selectedPageNumber);
-  if (index === -1 || index + 1 >= state.pages.length) {
+  if (!state.selectedPageNumber || state.selectedPageNumber >= state.pageTotal) {
     showStatus("You've reached the last page.", "info");
     return;
   }
-  selectPage(state.pages[index + 1].page_number);
+  selectPage(state.selectedPageNumber + 1);
 }
 
 function handlePageDownload() {
@@ -626,7 +874,7 @@ async function handleDocumentSelect(event) {
   const docId = event.target.value;
   if (docId === "new") {
     state.docId = null;
-    state.pages = [];
+    resetPages();
     state.currentDocument = null;
     state.generalMode = false;
     clearPageDetails();
@@ -637,7 +885,7 @@ async function handleDocumentSelect(event) {
   }
   if (!docId) {
     state.docId = null;
-    state.pages = [];
+    resetPages();
     state.currentDocument = null;
     state.generalMode = true;
     clearPageDetails();
@@ -219,6 +219,17 @@ function hideUpload() {
     showUpload(false);
 }
 
+async function waitForJob(jobId, interval = 1000) {
+    for (;;) {
+        const { job } = await fetchJson(`/api/jobs/${jobId}`);
+        if (job.status === "done") return job;
+        if (job.status === "failed") {
+            throw new Error(job.error || "Processing the PDF failed.");
+        }
+        await new Promise((resolve) => setTimeout(resolve, interval));
+    }
+}
+
 async function handleUpload(e) {
     e.preventDefault();
     const formData = new FormData();
@@ -241,6 +252,7 @@ async function handleUpload(e) {
         elements.uploadFile.value = "";
         elements.uploadName.value = "";
         showUpload(false);
+        await waitForJob(data.job_id);
 
         await loadDocuments();
         state.docId = data.doc_id;
@@ -0,0 +1,213 @@
+"""Render small PNG previews of split pages and keep them in a bounded disk cache."""
+from __future__ import annotations
+
+import os
+import shutil
+import struct
+import subprocess
+import tempfile
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+from .forking import register_after_fork
+
+try:  # Optional: pip install pypdfium2 (ships its own PDFium, works offline).
+    import pypdfium2 as pdfium
+except ImportError:  # pragma: no cover - depends on the environment
+    pdfium = None
+
+
+MIN_WIDTH = 32
+MAX_WIDTH = 800
+# PDFium is not thread-safe, so every render goes through this lock.
+_RENDER_LOCK = threading.Lock()
+# How stale a cache's view of its folder may get before it rereads it to
+# account for files other processes have written or evicted.
+RESCAN_INTERVAL = 30.0
+
+
+def clamp_width(width: int) -> int:
+    return max(MIN_WIDTH, min(MAX_WIDTH, int(width)))
+
+
+def _png_chunk(chunk_type: bytes, data: bytes) -> bytes:
+    """Return a properly framed PNG chunk with length and CRC."""
+    crc = zlib.crc32(chunk_type + data) & 0xFFFFFFFF
+    return struct.pack(">I", len(data)) + chunk_type + data + struct.pack(">I", crc)
+
+
+def encode_png(rgb: bytes, width: int, height: int, stride: int) -> bytes:
+    """Encode packed 8-bit RGB rows (``stride`` bytes apart) as a PNG."""
+    rows = bytearray()
+    for y in range(height):
+        rows.append(0)  # no filter
+        rows += rgb[y * stride : y * stride + width * 3]
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + _png_chunk(b"IHDR", header)
+        + _png_chunk(b"IDAT", zlib.compress(bytes(rows), 6))
+        + _png_chunk(b"IEND", b"")
+    )
+
+
+def _render_pdfium(page_file: Path, width: int) -> bytes:
+    with _RENDER_LOCK:
+        document = pdfium.PdfDocument(str(page_file))
+        try:
+            page = document[0]
+            page_width, _ = page.get_size()
+            bitmap = page.render(scale=width / page_width, rev_byteorder=True)
+            return encode_png(bytes(bitmap.buffer), bitmap.width, bitmap.height, bitmap.stride)
+        finally:
+            document.close()
+
+
+def _render_pdftoppm(page_file: Path, width: int) -> bytes:
+    with tempfile.TemporaryDirectory() as tmp:
+        prefix = Path(tmp) / "thumb"
+        subprocess.run(
+            [
+                "pdftoppm", "-png", "-singlefile", "-f", "1", "-l", "1",
+                "-scale-to-x", str(width), "-scale-to-y", "-1",
+                str(page_file), str(prefix),
+            ],
+            check=True,
+            capture_output=True,
+            timeout=60,
+        )
+        return prefix.with_suffix(".png").read_bytes()
+
+
+def available_renderer() -> Optional[str]:
+    """Name the renderer that will be used, or ``None`` if neither is installed."""
+    if pdfium is not None:
+        return "pypdfium2"
+    if shutil.which("pdftoppm"):
+        return "pdftoppm"
+    return None
+
+
+def render_thumbnail(page_file: Path, width: int) -> bytes:
+    """Rasterise the first page of ``page_file`` to a PNG ``width`` pixels wide."""
+    renderer = available_renderer()
+    if renderer == "pypdfium2":
+        return _render_pdfium(page_file, width)
+    if renderer == "pdftoppm":
+        return _render_pdftoppm(page_file, width)
+    raise RuntimeError("No PDF renderer available; install pypdfium2 or poppler-utils.")
+
+
+class ThumbnailCache:
+    """Disk-backed PNG cache with a total size limit and least-recently-used eviction.
+
+    Recency is tracked in memory only. A served thumbnail is never touched,
+    so its Last-Modified and content digest stay stable; after a restart the
+    order falls back to when each file was rendered.
+
+    Several processes may share ``root``. Each adopts files the others
+    rendered when they are requested, and before evicting rereads the folder
+    if its view is older than ``RESCAN_INTERVAL``, so the size limit holds for
+    the folder as a whole rather than per process. Files it has not served
+    itself count as the least recently used.
+    """
+
+    def __init__(self, root: Path, max_bytes: int = 64 * 1024 * 1024, width: int = 160) -> None:
+        self.root = root
+        self.max_bytes = max_bytes
+        self.width = clamp_width(width)
+        self._entries: "OrderedDict[Path, int]" = OrderedDict()
+        self._total = 0
+        self._lock = threading.Lock()
+        self._scanned = 0.0
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._rescan()
+        register_after_fork(self._after_fork)
+
+    def _after_fork(self) -> None:
+        # Another thread may have held the lock at the moment of the fork.
+        self._lock = threading.Lock()
+
+    def _rescan(self) -> None:
+        """Bring the in-memory view in line with the files actually in ``root``."""
+        on_disk = {}
+        for path in self.root.glob("*/*.png"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            on_disk[path] = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            known = [(path, on_disk[path][1]) for path in self._entries if path in on_disk]
+            unknown = sorted(
+                (mtime, path, size)
+                for path, (mtime, size) in on_disk.items()
+                if path not in self._entries
+            )
+            self._entries = OrderedDict((path, size) for _, path, size in unknown)
+            self._entries.update(known)
+            self._total = sum(self._entries.values())
+            self._scanned = time.monotonic()
+
+    def path_for(self, doc_id: str, page_number: int, width: int) -> Path:
+        return self.root / doc_id / f"page_{page_number:03}_w{width}.png"
+
+    def get(self, doc_id: str, page_number: int, page_file: Path, width: Optional[int] = None) -> Path:
+        """Return the cached thumbnail path, rendering it from ``page_file`` on a miss."""
+        width = clamp_width(width or self.width)
+        thumb = self.path_for(doc_id, page_number, width)
+        with self._lock:
+            if thumb in self._entries:
+                if thumb.exists():
+                    self._entries.move_to_end(thumb)
+                    return thumb
+                # Evicted by another process.
+                self._total -= self._entries.pop(thumb)
+        try:
+            size = thumb.stat().st_size
+        except FileNotFoundError:
+            pass
+        else:
+            # Rendered by another process.
+            with self._lock:
+                self._total += size - self._entries.pop(thumb, 0)
+                self._entries[thumb] = size
+            return thumb
+
+        data = render_thumbnail(page_file, width)
+        thumb.parent.mkdir(parents=True, exist_ok=True)
+        partial = thumb.with_name(f".{thumb.name}.{threading.get_ident()}.tmp")
+        partial.write_bytes(data)
+        os.replace(partial, thumb)
+        if time.monotonic() - self._scanned >= RESCAN_INTERVAL:
+            self._rescan()
+        with self._lock:
+            self._total += len(data) - self._entries.pop(thumb, 0)
+            self._entries[thumb] = len(data)
+            self._evict()
+        return thumb
+
+    def _evict(self) -> None:
+        while self._total > self.max_bytes and len(self._entries) > 1:
+            path, size = self._entries.popitem(last=False)
+            self._total -= size
+            try:
+                path.unlink()
+            except OSError:
+                pass
+
+    def discard(self, doc_id: str) -> None:
+        """Forget and delete every thumbnail for ``doc_id``."""
+        folder = self.root / doc_id
+        with self._lock:
+            for path in [path for path in self._entries if path.parent == folder]:
+                self._total -= self._entries.pop(path)
+        shutil.rmtree(folder, ignore_errors=True)
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total
@@ -0,0 +1,193 @@
+"""Resumable chunked uploads written straight to disk.
+
+A client starts an upload with the file's size (and, if it knows it, the
+SHA-256), sends the bytes as chunks at increasing offsets and then finishes
+the upload. Each chunk is copied to the partial file in fixed-size blocks,
+so memory use does not depend on chunk or file size. The database records
+how many bytes are on disk. After an interruption the client asks for that
+offset and carries on from there.
+"""
+from __future__ import annotations
+
+import errno
+import hashlib
+import os
+import re
+import shutil
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import BinaryIO, Optional
+
+from .db import DatabaseManager, Upload
+
+BLOCK_SIZE = 1024 * 1024
+PDF_MAGIC = b"%PDF-"
+_SHA256 = re.compile(r"^[0-9a-f]{64}$")
+
+
+class UploadError(Exception):
+    """A rejected upload request; ``status`` is the HTTP status to answer with."""
+
+    def __init__(self, message: str, status: int = 400) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+def _check_sha256(value: Optional[str]) -> Optional[str]:
+    if value is None:
+        return None
+    value = value.strip().lower()
+    if not _SHA256.match(value):
+        raise UploadError("sha256 must be 64 hexadecimal digits.")
+    return value
+
+
+def _move(partial: Path, destination: Path) -> None:
+    """Move a finished upload, copying it if ``destination`` is on another filesystem."""
+    try:
+        os.replace(partial, destination)
+        return
+    except OSError as exc:
+        if exc.errno != errno.EXDEV:
+            raise
+    # Claim the file under a new name first, so a concurrent finish finds it
+    # gone just as it would after a rename.
+    claimed = partial.with_suffix(".finishing")
+    os.replace(partial, claimed)
+    try:
+        shutil.move(str(claimed), str(destination))
+    except BaseException:
+        os.replace(claimed, partial)
+        raise
+
+
+class ChunkedUploads:
+    """Upload sessions stored in ``root/partial`` until they are finished.
+
+    ``received`` only advances after a chunk has been written and synced, and
+    only from the offset the chunk was written at. Two writers racing for the
+    same offset therefore cannot both succeed, even in different processes.
+    Sessions that receive nothing for ``expire_after`` are deleted.
+    """
+
+    def __init__(
+        self,
+        db: DatabaseManager,
+        root: Path,
+        max_size: int,
+        expire_after: timedelta = timedelta(hours=24),
+    ) -> None:
+        self.db = db
+        self.partial_root = root / "partial"
+        self.max_size = max_size
+        self.expire_after = expire_after
+
+    def _partial(self, upload_id: str) -> Path:
+        return self.partial_root / f"{upload_id}.part"
+
+    def create(self, name: str, size: int, sha256: Optional[str] = None) -> Upload:
+        if size <= 0:
+            raise UploadError("size must be a positive number of bytes.")
+        if size > self.max_size:
+            raise UploadError(f"Uploads are limited to {self.max_size} bytes.", 413)
+        sha256 = _check_sha256(sha256)
+        self.expire()
+        upload_id = uuid.uuid4().hex
+        self.partial_root.mkdir(parents=True, exist_ok=True)
+        self._partial(upload_id).touch()
+        return self.db.create_upload(upload_id, name, size, sha256)
+
+    def get(self, upload_id: str) -> Upload:
+        upload = self.db.get_upload(upload_id)
+        if upload is None:
+            raise UploadError("Unknown upload.", 404)
+        return upload
+
+    def write(
+        self,
+        upload_id: str,
+        offset: int,
+        stream: BinaryIO,
+        length: Optional[int],
+        chunk_sha256: Optional[str] = None,
+    ) -> Upload:
+        """Store ``length`` bytes from ``stream`` at ``offset``, which must equal ``received``.
+
+        With ``chunk_sha256`` the chunk only counts if its hash matches; a
+        rejected or cut-off chunk leaves ``received`` where it was and may
+        simply be sent again.
+        """
+        chunk_sha256 = _check_sha256(chunk_sha256)
+        upload = self.get(upload_id)
+        if offset != upload.received:
+            raise UploadError(f"Expected offset {upload.received}.", 409)
+        if length is None:
+            raise UploadError("Content-Length is required.", 411)
+        if length <= 0 or offset + length > upload.size:
+            raise UploadError("The chunk must be non-empty and end within the declared size.")
+
+        digest = hashlib.sha256()
+        written = 0
+        try:
+            with self._partial(upload_id).open("r+b") as handle:
+                handle.seek(offset)
+                while written < length:
+                    block = stream.read(min(BLOCK_SIZE, length - written))
+                    if not block:
+                        break
+                    handle.write(block)
+                    digest.update(block)
+                    written += len(block)
+                handle.flush()
+                os.fsync(handle.fileno())
+        except FileNotFoundError:
+            raise UploadError("Unknown upload.", 404) from None
+        if written != length:
+            raise UploadError("The chunk ended early; send it again.")
+        if chunk_sha256 and digest.hexdigest() != chunk_sha256:
+            raise UploadError("The chunk's SHA-256 does not match; send it again.", 422)
+        if not self.db.advance_upload(upload_id, offset, offset + written):
+            raise UploadError("Another chunk was written at this offset.", 409)
+        return self.get(upload_id)
+
+    def finish(self, upload_id: str, destination: Path) -> str:
+        """Verify a complete upload, move it to ``destination`` and return its SHA-256.
+
+        A file that fails verification is discarded along with its session.
+        """
+        upload = self.get(upload_id)
+        if upload.received != upload.size:
+            raise UploadError(f"Only {upload.received} of {upload.size} bytes have arrived.", 409)
+        partial = self._partial(upload_id)
+        digest = hashlib.sha256()
+        try:
+            with partial.open("rb") as handle:
+                head = handle.read(len(PDF_MAGIC))
+                digest.update(head)
+                for block in iter(lambda: handle.read(BLOCK_SIZE), b""):
+                    digest.update(block)
+            sha256 = digest.hexdigest()
+            if upload.sha256 and sha256 != upload.sha256:
+                self.cancel(upload_id)
+                raise UploadError("The file's SHA-256 does not match; upload it again.", 422)
+            if head != PDF_MAGIC:
+                self.cancel(upload_id)
+                raise UploadError("Provide a PDF file.")
+            _move(partial, destination)
+        except FileNotFoundError:
+            # Finished (or cancelled) by a concurrent request.
+            raise UploadError("Unknown upload.", 404) from None
+        self.db.delete_upload(upload_id)
+        return sha256
+
+    def cancel(self, upload_id: str) -> bool:
+        self._partial(upload_id).unlink(missing_ok=True)
+        return self.db.delete_upload(upload_id)
+
+    def expire(self) -> int:
+        """Delete sessions that have been idle for longer than ``expire_after``."""
+        stale = self.db.list_stale_uploads(datetime.utcnow() - self.expire_after)
+        for upload in stale:
+            self.cancel(upload.upload_id)
+        return len(stale)
@@ -1,57 +1,311 @@
 """Flask-powered web interface for the Pdf Notebook Assistant."""
 from __future__ import annotations
 
+import hashlib
+import html
+import os
+import threading
 import uuid
+from functools import lru_cache
 from pathlib import Path
-from typing import Any
-from datetime import datetime
+from typing import Any, Mapping, Optional, Tuple
+from datetime import datetime, timedelta
 
 from flask import (
+    Blueprint,
     Flask,
     abort,
+    current_app,
     jsonify,
     render_template,
     request,
+    send_file,
     send_from_directory,
     Response,
 )
-from werkzeug.utils import secure_filename
-
-from .db import DatabaseManager, GeneralEntry, PageEntry
-from .pdf_processor import ensure_page_splits
-import shutil
+from werkzeug.local import LocalProxy
+from werkzeug.utils import safe_join, secure_filename
+
+from .blobs import BlobStore
+from .db import (
+    HIGHLIGHT_END,
+    HIGHLIGHT_START,
+    SEARCH_KINDS,
+    DatabaseManager,
+    Document,
+    GeneralEntry,
+    Job,
+    PageEntry,
+    SearchHit,
+    Upload,
+)
+from .export import FORMATS, export_filename, export_stream, export_window, parse_watermark
+from .jobs import BackgroundTasks, DocumentReaper, IngestQueue, MaintenanceLock
+from .page_status import PageStatusMap
+from .pdf_processor import LazyPageExtractor, page_filename
+from .thumbnails import ThumbnailCache, available_renderer
+from .uploads import ChunkedUploads, UploadError
 
 PACKAGE_ROOT = Path(__file__).resolve().parents[1]
 DATA_ROOT = PACKAGE_ROOT / "data"
-UPLOAD_ROOT = DATA_ROOT / "uploads"
-SPLIT_ROOT = DATA_ROOT / "split_pages"
-DB_PATH = DATA_ROOT / "notes.db"
-
-DATA_ROOT.mkdir(parents=True, exist_ok=True)
-UPLOAD_ROOT.mkdir(parents=True, exist_ok=True)
-SPLIT_ROOT.mkdir(parents=True, exist_ok=True)
-
-db_manager = DatabaseManager(DB_PATH)
-
-# Ensure global general document exists
-if not db_manager.get_document("global-general"):
-    db_manager.create_document(
-        "global-general",
-        "General Notebook",
-        Path("general_notebook_dummy"),
-        0
+
+# Split page files never change once written, so browsers may keep them for a year.
+PAGE_MAX_AGE = 365 * 24 * 60 * 60
+# Upper bound for ?limit= on the page listing.
+MAX_PAGE_WINDOW = 500
+MAX_SEARCH_RESULTS = 100
+MAX_RANDOM_SAMPLE = 50
+
+
+def default_config(data_root: Path = DATA_ROOT) -> dict[str, Any]:
+    """App settings from PDFNOTEBOOK_* environment variables, with files under ``data_root``."""
+    env = os.environ.get
+    upload_root = data_root / "uploads"
+    return {
+        "DATA_ROOT": data_root,
+        "DATABASE": data_root / "notes.db",
+        "UPLOAD_FOLDER": upload_root,
+        "ATTACHMENTS_FOLDER": upload_root / "attachments",
+        "SPLIT_FOLDER": data_root / "split_pages",
+        "BLOB_FOLDER": data_root / "blobs",
+        "THUMB_FOLDER": data_root / "thumbnails",
+        "DB_JOURNAL_MODE": env("PDFNOTEBOOK_DB_JOURNAL_MODE", "wal"),
+        "DB_SYNCHRONOUS": env("PDFNOTEBOOK_DB_SYNCHRONOUS", "normal"),
+        "DB_BUSY_TIMEOUT": int(env("PDFNOTEBOOK_DB_BUSY_TIMEOUT", "5000")),
+        "DB_CACHE_SIZE": int(env("PDFNOTEBOOK_DB_CACHE_SIZE", "256")),
+        "DB_CACHE_TTL": float(env("PDFNOTEBOOK_DB_CACHE_TTL", "30")),
+        "INGEST_WORKERS": int(env("PDFNOTEBOOK_INGEST_WORKERS", "2")),
+        "SPLIT_WORKERS": int(env("PDFNOTEBOOK_SPLIT_WORKERS", os.cpu_count() or 1)),
+        # "eager" splits every page at upload; "lazy" extracts pages as they are viewed.
+        "SPLIT_MODE": env("PDFNOTEBOOK_SPLIT_MODE", "eager").lower(),
+        "PREFETCH_PAGES": int(env("PDFNOTEBOOK_PREFETCH_PAGES", "2")),
+        "THUMB_CACHE_MB": int(env("PDFNOTEBOOK_THUMB_CACHE_MB", "64")),
+        "THUMB_WIDTH": int(env("PDFNOTEBOOK_THUMB_WIDTH", "160")),
+        # Chunked uploads: the largest file accepted, the chunk size suggested
+        # to clients, and how long an idle upload is kept.
+        "MAX_UPLOAD_SIZE": int(env("PDFNOTEBOOK_MAX_UPLOAD_MB", "2048")) * 1024 * 1024,
+        "UPLOAD_CHUNK_SIZE": 8 * 1024 * 1024,
+        "UPLOAD_EXPIRE_HOURS": float(env("PDFNOTEBOOK_UPLOAD_EXPIRE_HOURS", "24")),
+        # Deleted documents are removed in the background: how often each
+        # process looks for them, and how often one sweeps for orphaned folders.
+        "REAP_INTERVAL": float(env("PDFNOTEBOOK_REAP_INTERVAL", "5")),
+        "ORPHAN_SWEEP_HOURS": float(env("PDFNOTEBOOK_ORPHAN_SWEEP_HOURS", "6")),
+        "JSON_SORT_KEYS": False,
+        "MAX_CONTENT_LENGTH": 64 * 1024 * 1024,  # 64MB limit
+    }
+
+
+class AppState:
+    """The database and workers behind the routes, built on first use.
+
+    Creating an app only records its configuration, so importing this module
+    or building an app for tests and tooling opens nothing. The first request
+    (or an explicit ``start()``) opens the database and starts the process's
+    background thread, which reaps deleted documents and, in one process at
+    a time, resumes interrupted ingestion jobs, backfills the search index
+    and sweeps orphaned files (see ``BackgroundTasks``).
+
+    A preforking server calls ``prepare()`` in its master instead: that
+    creates the data folders and migrates the database, then closes it, so
+    the master forks its workers without SQLite handles, locks held by
+    threads or threads that would not survive the fork. Each worker then
+    calls ``start()`` once it exists.
+    """
+
+    def __init__(self, config: Mapping[str, Any]) -> None:
+        self.config = config
+        self._lock = threading.Lock()
+        self._started = False
+        self._db: Optional[DatabaseManager] = None
+        self._ingest_queue: Optional[IngestQueue] = None
+        self._page_extractor: Optional[LazyPageExtractor] = None
+        self._thumbnail_cache: Optional[ThumbnailCache] = None
+        self._uploads: Optional[ChunkedUploads] = None
+        self._blobs: Optional[BlobStore] = None
+        self._tasks: Optional[BackgroundTasks] = None
+
+    @property
+    def db(self) -> DatabaseManager:
+        self.start()
+        return self._db
+
+    @property
+    def ingest_queue(self) -> IngestQueue:
+        self.start()
+        return self._ingest_queue
+
+    @property
+    def page_extractor(self) -> LazyPageExtractor:
+        self.start()
+        return self._page_extractor
+
+    @property
+    def thumbnail_cache(self) -> ThumbnailCache:
+        self.start()
+        return self._thumbnail_cache
+
+    @property
+    def uploads(self) -> ChunkedUploads:
+        self.start()
+        return self._uploads
+
+    @property
+    def blobs(self) -> BlobStore:
+        self.start()
+        return self._blobs
+
+    @property
+    def tasks(self) -> BackgroundTasks:
+        self.start()
+        return self._tasks
+
+    @property
+    def lazy_splits(self) -> bool:
+        return self.config["SPLIT_MODE"] == "lazy"
+
+    def _open_database(self) -> DatabaseManager:
+        config = self.config
+        for folder in ("UPLOAD_FOLDER", "ATTACHMENTS_FOLDER", "SPLIT_FOLDER", "BLOB_FOLDER"):
+            Path(config[folder]).mkdir(parents=True, exist_ok=True)
+        db = DatabaseManager(
+            Path(config["DATABASE"]),
+            journal_mode=config["DB_JOURNAL_MODE"],
+            synchronous=config["DB_SYNCHRONOUS"],
+            busy_timeout=config["DB_BUSY_TIMEOUT"],
+            cache_size=config["DB_CACHE_SIZE"],
+            cache_ttl=config["DB_CACHE_TTL"],
+        )
+        # Ensure global general document exists
+        if not db.get_document("global-general"):
+            db.create_document(
+                "global-general",
+                "General Notebook",
+                Path("general_notebook_dummy"),
+                0
+            )
+        return db
+
+    def prepare(self) -> None:
+        """Create the data folders and migrate the database, leaving nothing open."""
+        self._open_database().close()
+
+    def start(self) -> None:
+        """Build every service and start the background thread; later calls return immediately."""
+        if self._started:
+            return
+        with self._lock:
+            if self._started:
+                return
+            config = self.config
+            db = self._open_database()
+            blobs = BlobStore(db, Path(config["BLOB_FOLDER"]), Path(config["SPLIT_FOLDER"]))
+            ingest_queue = IngestQueue(
+                db,
+                Path(config["SPLIT_FOLDER"]),
+                workers=config["INGEST_WORKERS"],
+                split_workers=config["SPLIT_WORKERS"],
+                lazy=self.lazy_splits,
+                blobs=blobs,
+            )
+            self._page_extractor = LazyPageExtractor(prefetch=config["PREFETCH_PAGES"])
+            self._thumbnail_cache = ThumbnailCache(
+                Path(config["THUMB_FOLDER"]),
+                max_bytes=config["THUMB_CACHE_MB"] * 1024 * 1024,
+                width=config["THUMB_WIDTH"],
+            )
+            self._uploads = ChunkedUploads(
+                db,
+                Path(config["UPLOAD_FOLDER"]),
+                max_size=config["MAX_UPLOAD_SIZE"],
+                expire_after=timedelta(hours=config["UPLOAD_EXPIRE_HOURS"]),
+            )
+            reaper = DocumentReaper(
+                db,
+                blobs,
+                Path(config["SPLIT_FOLDER"]),
+                Path(config["ATTACHMENTS_FOLDER"]),
+                thumbnails=self._thumbnail_cache,
+                extractor=self._page_extractor,
+            )
+            self._tasks = BackgroundTasks(
+                db,
+                ingest_queue,
+                reaper,
+                MaintenanceLock(Path(config["DATA_ROOT"]) / ".maintenance.lock"),
+                interval=config["REAP_INTERVAL"],
+                sweep_interval=config["ORPHAN_SWEEP_HOURS"] * 3600,
+            )
+            self._tasks.start()
+            self._blobs = blobs
+            self._db = db
+            self._ingest_queue = ingest_queue
+            self._started = True
+
+
+def _state() -> AppState:
+    return current_app.extensions["pdfnotebook"]
+
+
+# The current app's services; each is built on first use (see AppState).
+db_manager: DatabaseManager = LocalProxy(lambda: _state().db)  # type: ignore[assignment]
+ingest_queue: IngestQueue = LocalProxy(lambda: _state().ingest_queue)  # type: ignore[assignment]
+page_extractor: LazyPageExtractor = LocalProxy(lambda: _state().page_extractor)  # type: ignore[assignment]
+thumbnail_cache: ThumbnailCache = LocalProxy(lambda: _state().thumbnail_cache)  # type: ignore[assignment]
+chunked_uploads: ChunkedUploads = LocalProxy(lambda: _state().uploads)  # type: ignore[assignment]
+blob_store: BlobStore = LocalProxy(lambda: _state().blobs)  # type: ignore[assignment]
+
+bp = Blueprint("pdfnotebook", __name__)
+
+
+def create_app(config: Optional[Mapping[str, Any]] = None) -> Flask:
+    """Build the Flask app; ``config`` overrides the environment defaults.
+
+    Setting only ``DATA_ROOT`` moves the database and every data folder under
+    it. Nothing is opened or created until the app's services are first used.
+    """
+    config = dict(config or {})
+    app = Flask(
+        __name__,
+        static_folder="static",
+        template_folder="templates",
     )
+    app.config.update(default_config(Path(config.get("DATA_ROOT", DATA_ROOT))))
+    app.config.update(config)
+    app.extensions["pdfnotebook"] = AppState(app.config)
+    app.register_blueprint(bp)
+    return app
+
+
+@lru_cache(maxsize=4096)
+def _file_digest(path: str, mtime_ns: int, size: int) -> str:
+    """Hash a file's content; the stat fields key the cache so rewrites miss it."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as handle:
+        for chunk in iter(lambda: handle.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _require_live_document(doc_id: str) -> None:
+    """Abort with 404 unless ``doc_id`` exists and is not tombstoned.
+
+    Called inside the transaction of a write: the tombstone is written under
+    the same lock, so a write that passes cannot land after the reaper has
+    started purging the document's rows. It reads the row on the
+    transaction's connection rather than through the read cache, which
+    another thread may have refilled just before the tombstone committed.
+    """
+    if not db_manager.document_is_live(doc_id):
+        abort(404)
 
-app = Flask(
-    __name__,
-    static_folder="static",
-    template_folder="templates",
-)
-app.config["JSON_SORT_KEYS"] = False
-app.config["UPLOAD_FOLDER"] = UPLOAD_ROOT
-app.config["ATTACHMENTS_FOLDER"] = UPLOAD_ROOT / "attachments"
-app.config["ATTACHMENTS_FOLDER"].mkdir(parents=True, exist_ok=True)
-app.config["MAX_CONTENT_LENGTH"] = 64 * 1024 * 1024  # 64MB limit
+
+def _parse_page_number(value: Any, doc: Document) -> Optional[int]:
+    """Return ``value`` as one of ``doc``'s page numbers, or ``None`` if it is not one."""
+    try:
+        page_number = int(value)
+    except (TypeError, ValueError):
+        return None
+    return page_number if 1 <= page_number <= doc.page_count else None
 
 
 def _document_payload(doc: Any) -> dict[str, Any]:
@@ -65,6 +319,64 @@ def _document_payload(doc: Any) -> dict[str, Any]:
     }
 
 
+def _job_payload(job: Job) -> dict[str, Any]:
+    return {
+        "id": job.job_id,
+        "doc_id": job.doc_id,
+        "name": job.name,
+        "status": job.status,
+        "pages_done": job.pages_done,
+        "page_count": job.page_count,
+        "error": job.error,
+        "created_at": job.created_at.isoformat(),
+        "updated_at": job.updated_at.isoformat(),
+    }
+
+
+def _upload_payload(upload: Upload) -> dict[str, Any]:
+    return {
+        "id": upload.upload_id,
+        "name": upload.name,
+        "size": upload.size,
+        "received": upload.received,
+        "chunk_size": current_app.config["UPLOAD_CHUNK_SIZE"],
+        "created_at": upload.created_at.isoformat(),
+        "updated_at": upload.updated_at.isoformat(),
+    }
+
+
+def _status_payload(status: PageStatusMap) -> dict[str, Any]:
+    return {
+        "flags": status.encode(),
+        "progress": status.counts(),
+        "next_incomplete": status.first_pending(),
+    }
+
+
+def _highlight(text: str) -> str:
+    """Escape matched text for HTML and wrap the matched terms in <mark>."""
+    return (
+        html.escape(text)
+        .replace(HIGHLIGHT_START, "<mark>")
+        .replace(HIGHLIGHT_END, "</mark>")
+    )
+
+
+def _search_payload(hit: SearchHit) -> dict[str, Any]:
+    return {
+        "kind": hit.kind,
+        "id": hit.id,
+        "doc_id": hit.doc_id,
+        "page_number": hit.page_number,
+        "author": _highlight(hit.author),
+        "user_input": _highlight(hit.user_input),
+        "output": _highlight(hit.output),
+        "tags": _highlight(hit.tags),
+        "rank": hit.rank,
+        "timestamp": hit.timestamp.isoformat(),
+    }
+
+
 def _general_payload(entry: GeneralEntry) -> dict[str, Any]:
     return {
         "author": entry.author,
@@ -90,95 +402,236 @@ def _page_entry_payload(entry: PageEntry) -> dict[str, Any]:
     }
 
 
-@app.route("/")
+@bp.route("/")
 def index() -> str:
-    return render_template("index.html")
+    # Without a renderer the page list leaves thumbnails out instead of requesting them.
+    return render_template("index.html", thumbnails=available_renderer() is not None)
 
 
-@app.route("/test-ui")
+@bp.route("/test-ui")
 def test_ui() -> str:
     return render_template("test_ui.html")
 
 
-@app.route("/api/documents", methods=["GET"])
+@bp.route("/api/documents", methods=["GET"])
 def list_documents() -> Any:
     docs = db_manager.list_documents()
     return jsonify({"documents": [_document_payload(doc) for doc in docs]})
 
 
-@app.route("/attachments/<path:filename>")
+@bp.route("/attachments/<path:filename>")
 def get_attachment(filename: str) -> Response:
-    return send_from_directory(app.config["ATTACHMENTS_FOLDER"], filename)
+    return send_from_directory(current_app.config["ATTACHMENTS_FOLDER"], filename)
 
 
-@app.route("/api/documents", methods=["POST"])
+@bp.route("/api/documents", methods=["POST"])
 def upload_document() -> Any:
     file = request.files.get("file")
     if not file or not file.filename.lower().endswith(".pdf"):
         return jsonify({"error": "Provide a PDF file."}), 400
 
     doc_name = request.form.get("name") or Path(file.filename).stem
+    incoming, sha256 = blob_store.receive(file.stream)
+    return _queue_ingest(doc_name, incoming, sha256)
+
+
+def _queue_ingest(doc_name: str, incoming: Path, sha256: str) -> Any:
+    # Content already in the blob store is not stored again, and its job
+    # finds the existing splits instead of making new ones.
+    source, reused = blob_store.store(incoming, sha256)
     doc_id = uuid.uuid4().hex
-    destination = UPLOAD_ROOT / f"{doc_id}.pdf"
-    file.save(destination)
+    # Splitting and indexing happen in the background; the client polls the job.
+    job = db_manager.create_job(uuid.uuid4().hex, doc_id, doc_name, source, content_hash=sha256)
+    ingest_queue.submit(job.job_id)
+    return (
+        jsonify(
+            {
+                "job_id": job.job_id,
+                "doc_id": doc_id,
+                "name": doc_name,
+                "sha256": sha256,
+                "reused": reused,
+            }
+        ),
+        202,
+    )
+
+
+@bp.errorhandler(UploadError)
+def upload_error(exc: UploadError) -> Any:
+    return jsonify({"error": str(exc)}), exc.status
+
+
+@bp.route("/api/uploads", methods=["POST"])
+def create_upload() -> Any:
+    """Start a chunked upload: ``{"size": bytes, "filename", "name", "sha256"}``.
+
+    Send the file with PUT /api/uploads/<id>?offset=N, one chunk per request
+    (an optional ``X-Chunk-Sha256`` header verifies each chunk), then POST
+    /api/uploads/<id>/finalize. After an interruption, GET the upload and
+    continue from its ``received`` offset.
+    """
+    data = request.get_json(force=True)
+    filename = data.get("filename") or ""
+    if filename and not filename.lower().endswith(".pdf"):
+        return jsonify({"error": "Provide a PDF file."}), 400
+    size = data.get("size")
+    if isinstance(size, bool) or not isinstance(size, int):
+        return jsonify({"error": "size is required."}), 400
+    name = data.get("name") or Path(filename).stem or "Untitled"
+    upload = chunked_uploads.create(name, size, data.get("sha256"))
+    return jsonify(_upload_payload(upload)), 201
+
+
+@bp.route("/api/uploads/<upload_id>", methods=["GET"])
+def get_upload(upload_id: str) -> Any:
+    return jsonify(_upload_payload(chunked_uploads.get(upload_id)))
+
+
+@bp.route("/api/uploads/<upload_id>", methods=["PUT"])
+def put_upload_chunk(upload_id: str) -> Any:
+    """Write the raw request body at ``?offset=``, streaming it to disk."""
+    offset = request.args.get("offset", type=int)
+    if offset is None:
+        return jsonify({"error": "offset is required."}), 400
+    upload = chunked_uploads.write(
+        upload_id,
+        offset,
+        request.stream,
+        request.content_length,
+        request.headers.get("X-Chunk-Sha256"),
+    )
+    return jsonify(_upload_payload(upload))
+
+
+@bp.route("/api/uploads/<upload_id>/finalize", methods=["POST"])
+def finalize_upload(upload_id: str) -> Any:
+    """Verify the whole file's SHA-256 and queue it for splitting like a regular upload."""
+    upload = chunked_uploads.get(upload_id)
+    incoming = blob_store.incoming_path()
+    sha256 = chunked_uploads.finish(upload_id, incoming)
+    return _queue_ingest(upload.name, incoming, sha256)
+
+
+@bp.route("/api/uploads/<upload_id>", methods=["DELETE"])
+def cancel_upload(upload_id: str) -> Any:
+    if not chunked_uploads.cancel(upload_id):
+        abort(404)
+    return jsonify({"deleted": upload_id})
+
 
-    split_dir = SPLIT_ROOT / doc_id
-    page_files = ensure_page_splits(destination, split_dir)
-    db_manager.create_document(doc_id, doc_name, destination, len(page_files))
-    db_manager.ensure_page_entries(doc_id, len(page_files))
-    return jsonify({"doc_id": doc_id, "name": doc_name})
+@bp.route("/api/jobs/<job_id>", methods=["GET"])
+def get_job(job_id: str) -> Any:
+    job = db_manager.get_job(job_id)
+    if not job:
+        abort(404)
+    return jsonify({"job": _job_payload(job)})
 
 
-@app.route("/api/documents/<doc_id>", methods=["DELETE"])
+@bp.route("/api/documents/<doc_id>", methods=["DELETE"])
 def delete_document(doc_id: str) -> Any:
-    doc = db_manager.get_document(doc_id)
-    if not doc:
+    # Only the tombstone is written here. The document vanishes from every
+    # read at once, and the reaper removes its rows and files afterwards.
+    if not db_manager.mark_document_deleted(doc_id):
         abort(404)
-    upload_path = Path(doc.source_path)
-    split_dir = SPLIT_ROOT / doc_id
-    if upload_path.exists():
-        try:
-            upload_path.unlink()
-        except Exception:
-            pass
-    if split_dir.exists():
-        shutil.rmtree(split_dir, ignore_errors=True)
-    # Also delete attachments for this doc_id
-    doc_attachments_folder = app.config["ATTACHMENTS_FOLDER"] / doc_id
-    if doc_attachments_folder.exists():
-        shutil.rmtree(doc_attachments_folder, ignore_errors=True)
-    db_manager.delete_document(doc_id)
+    # Its pages, which are served without a database lookup, go at once too.
+    blob_store.unlink_document(doc_id)
+    _state().tasks.wake()
     return jsonify({"deleted": doc_id})
 
 
-@app.route("/api/pages/<doc_id>", methods=["GET"])
+@bp.route("/api/pages/<doc_id>", methods=["GET"])
 def get_pages(doc_id: str) -> Any:
+    """List pages, optionally one keyset window at a time.
+
+    ``?after_page=N&limit=M`` returns up to M pages numbered above N together
+    with ``next_after``, the cursor for the following window (``null`` at
+    the end). Without ``limit`` every page is returned along with the packed
+    status flags.
+    """
     doc = db_manager.get_document(doc_id)
     if not doc:
         abort(404)
-
-    notes = db_manager.fetch_page_notes(doc_id)
-    pages = []
-    for note in notes:
-        pages.append(
-            {
-                "page_number": note.page_number,
-                "complete": note.complete,
-                "ignored": note.ignored,
-                "skipped": note.skipped,
-                "entry_count": db_manager.get_entry_count(doc_id, note.page_number),
-            }
-        )
-
-    return jsonify(
+    after_page = max(0, request.args.get("after_page", 0, type=int))
+    limit = request.args.get("limit", type=int)
+    if limit is not None:
+        limit = max(1, min(MAX_PAGE_WINDOW, limit))
+
+    status = db_manager.get_page_status(doc_id)
+    summaries = db_manager.fetch_page_summaries(doc_id, after_page, limit)
+    pages = [
         {
-            "document": _document_payload(doc),
-            "pages": pages,
+            "page_number": summary.page_number,
+            "complete": summary.complete,
+            "ignored": summary.ignored,
+            "skipped": summary.skipped,
+            "entry_count": summary.entry_count,
         }
+        for summary in summaries
+    ]
+    payload = {
+        "document": _document_payload(doc),
+        "pages": pages,
+        "progress": status.counts(),
+    }
+    if limit is None:
+        payload["status"] = _status_payload(status)
+    else:
+        more = len(pages) == limit and pages[-1]["page_number"] < len(status)
+        payload["next_after"] = pages[-1]["page_number"] if more else None
+    response = jsonify(payload)
+    response.headers["X-Total-Count"] = str(len(status))
+    return response
+
+
+@bp.route("/api/status/<doc_id>", methods=["GET"])
+def get_page_status(doc_id: str) -> Any:
+    """Packed page flags and progress counts, cheap enough to poll after every save."""
+    doc = db_manager.get_document(doc_id)
+    if not doc:
+        abort(404)
+    return jsonify(_status_payload(db_manager.get_page_status(doc_id)))
+
+
+@bp.route("/api/export/<doc_id>", methods=["GET"])
+def export_document(doc_id: str) -> Any:
+    """Stream the document's notes, entry history and general entries as a download.
+
+    ``format`` is jsonl (default), csv or columns and ``gzip=1`` compresses
+    on the fly. ``since`` limits the export to records written after an
+    earlier export; the ``X-Export-Until`` header carries the value to pass
+    as ``since`` next time.
+    """
+    doc = db_manager.get_document(doc_id)
+    if not doc:
+        abort(404)
+    fmt = request.args.get("format", "jsonl")
+    if fmt not in FORMATS:
+        return jsonify({"error": f"format must be one of {', '.join(FORMATS)}."}), 400
+    since: Optional[int] = None
+    if request.args.get("since"):
+        try:
+            since = parse_watermark(request.args["since"])
+        except ValueError:
+            return jsonify({"error": "since must be the X-Export-Until value of an earlier export."}), 400
+    compress = request.args.get("gzip", "0").lower() in ("1", "true", "yes")
+
+    # The stream outlives the app context, so it gets the manager itself.
+    db = db_manager._get_current_object()
+    until = export_window(db, since)
+    response = Response(
+        export_stream(db, doc_id, fmt, since=since, until=until, compress=compress),
+        mimetype="application/gzip" if compress else FORMATS[fmt][1],
+    )
+    response.headers["Content-Disposition"] = (
+        f'attachment; filename="{export_filename(doc_id, fmt, compress)}"'
     )
+    response.headers["X-Export-Until"] = str(until)
+    response.headers["Cache-Control"] = "no-store"
+    return response
 
 
-@app.route("/api/general/<doc_id>", methods=["GET"])
+@bp.route("/api/general/<doc_id>", methods=["GET"])
 def list_general_entries(doc_id: str) -> Any:
     doc = db_manager.get_document(doc_id)
     if not doc:
@@ -193,24 +646,14 @@ def list_general_entries(doc_id: str) -> Any:
     )
 
 
-@app.route("/api/general", methods=["POST"])
+@bp.route("/api/general", methods=["POST"])
 def add_general_entry() -> Response:
     if request.is_json:
         data = request.json
-        attachment_path = None
+        file = None
     else:
         data = request.form
         file = request.files.get("attachment")
-        attachment_path = None
-        if file and file.filename:
-            filename = secure_filename(file.filename)
-            doc_folder = app.config["ATTACHMENTS_FOLDER"] / data["doc_id"]
-            doc_folder.mkdir(parents=True, exist_ok=True)
-
-            timestamp = datetime.utcnow().strftime("%Y%m%d%H%M%S")
-            save_name = f"{timestamp}_{filename}"
-            file.save(doc_folder / save_name)
-            attachment_path = f"{data['doc_id']}/{save_name}"
 
     doc_id = data.get("doc_id")
     if not doc_id:
@@ -220,18 +663,31 @@ def add_general_entry() -> Response:
     if not doc:
         abort(404)
 
-    db_manager.add_general_entry(
-        doc_id=data["doc_id"],
-        author=data.get("author", ""),
-        user_input=data.get("user_input", ""),
-        output=data.get("output", ""),
-        tags=data.get("tags", ""),
-        attachment_path=attachment_path,
-    )
+    attachment_path = None
+    if file and file.filename:
+        filename = secure_filename(file.filename)
+        doc_folder = Path(current_app.config["ATTACHMENTS_FOLDER"]) / doc_id
+        doc_folder.mkdir(parents=True, exist_ok=True)
+
+        timestamp = datetime.utcnow().strftime("%Y%m%d%H%M%S")
+        save_name = f"{timestamp}_{filename}"
+        file.save(doc_folder / save_name)
+        attachment_path = f"{doc_id}/{save_name}"
+
+    with db_manager.transaction():
+        _require_live_document(doc_id)
+        db_manager.add_general_entry(
+            doc_id=data["doc_id"],
+            author=data.get("author", ""),
+            user_input=data.get("user_input", ""),
+            output=data.get("output", ""),
+            tags=data.get("tags", ""),
+            attachment_path=attachment_path,
+        )
     return jsonify({"status": "ok"})
 
 
-@app.route("/api/entry/latest/<doc_id>", methods=["GET"])
+@bp.route("/api/entry/latest/<doc_id>", methods=["GET"])
 def latest_page_entry(doc_id: str) -> Any:
     doc = db_manager.get_document(doc_id)
     if not doc:
@@ -242,21 +698,30 @@ def latest_page_entry(doc_id: str) -> Any:
     return jsonify({"entry": _page_entry_payload(entry)})
 
 
-@app.route("/api/entry/random/<doc_id>", methods=["GET"])
+@bp.route("/api/entry/random/<doc_id>", methods=["GET"])
 def random_page_entry(doc_id: str) -> Any:
+    """One random entry, or ``?count=N`` distinct ones in shuffled order."""
     doc = db_manager.get_document(doc_id)
     if not doc:
         abort(404)
+    count = request.args.get("count", type=int)
+    if count is not None:
+        sample = db_manager.sample_page_entries(
+            doc_id, max(1, min(MAX_RANDOM_SAMPLE, count))
+        )
+        return jsonify({"entries": [_page_entry_payload(entry) for entry in sample]})
     entry = db_manager.get_random_page_entry(doc_id)
     if not entry:
         return jsonify({"error": "No page entries available."}), 404
     return jsonify({"entry": _page_entry_payload(entry)})
 
 
-@app.route("/api/pages/<doc_id>/<int:page_number>", methods=["GET"])
+@bp.route("/api/pages/<doc_id>/<int:page_number>", methods=["GET"])
 def get_page(doc_id: str, page_number: int) -> Any:
-    notes = db_manager.fetch_page_notes(doc_id)
-    page = next((page for page in notes if page.page_number == page_number), None)
+    doc = db_manager.get_document(doc_id)
+    if not doc:
+        abort(404)
+    page = db_manager.get_page_note(doc_id, page_number)
     if not page:
         abort(404)
     return jsonify(
@@ -272,33 +737,22 @@ def get_page(doc_id: str, page_number: int) -> Any:
             "tags": page.tags,
             "updated_at": page.updated_at.isoformat(),
             "attachment_path": page.attachment_path,
+            "entry_count": db_manager.get_entry_count(doc_id, page_number),
             }
         }
     )
 
 
-@app.route("/api/entry", methods=["POST"])
+@bp.route("/api/entry", methods=["POST"])
 def add_entry() -> Response:
     """Record a new entry for a page (history + current state)."""
     # Check if it's a JSON request or Multipart
     if request.is_json:
         data = request.json
-        attachment_path = None
+        file = None
     else:
         data = request.form
         file = request.files.get("attachment")
-        attachment_path = None
-        if file and file.filename:
-            filename = secure_filename(file.filename)
-            # Create doc-specific folder
-            doc_folder = app.config["ATTACHMENTS_FOLDER"] / data["doc_id"]
-            doc_folder.mkdir(parents=True, exist_ok=True)
-
-            # Save file
-            timestamp = datetime.utcnow().strftime("%Y%m%d%H%M%S")
-            save_name = f"{timestamp}_{filename}"
-            file.save(doc_folder / save_name)
-            attachment_path = f"{data['doc_id']}/{save_name}"
 
     doc_id = data.get("doc_id")
     page_number = data.get("page_number")
@@ -306,46 +760,66 @@ def add_entry() -> Response:
     if not doc_id or not page_number:
         return jsonify({"error": "doc_id and page_number are required."}), 400
 
-    # Also update the current note state
-    db_manager.upsert_page_note(
-        doc_id=data["doc_id"],
-        page_number=int(data["page_number"]),
-        author=data.get("author", ""),
-        user_input=data.get("user_input", ""),
-        output=data.get("output", ""),
-        complete=bool(data.get("complete", False)),
-        tags=data.get("tags", ""),
-        attachment_path=attachment_path,
-    )
+    doc = db_manager.get_document(doc_id)
+    if not doc:
+        abort(404)
+    page_number = _parse_page_number(page_number, doc)
+    if page_number is None:
+        return jsonify({"error": "page_number must be a page of the document."}), 400
+
+    attachment_path = None
+    if file and file.filename:
+        filename = secure_filename(file.filename)
+        # Create doc-specific folder
+        doc_folder = Path(current_app.config["ATTACHMENTS_FOLDER"]) / doc_id
+        doc_folder.mkdir(parents=True, exist_ok=True)
+
+        # Save file
+        timestamp = datetime.utcnow().strftime("%Y%m%d%H%M%S")
+        save_name = f"{timestamp}_{filename}"
+        file.save(doc_folder / save_name)
+        attachment_path = f"{doc_id}/{save_name}"
+
+    # Update the current note state and the history in a single commit
+    with db_manager.transaction():
+        _require_live_document(doc_id)
+        db_manager.upsert_page_note(
+            doc_id=data["doc_id"],
+            page_number=page_number,
+            author=data.get("author", ""),
+            user_input=data.get("user_input", ""),
+            output=data.get("output", ""),
+            complete=bool(data.get("complete", False)),
+            tags=data.get("tags", ""),
+            attachment_path=attachment_path,
+        )
 
-    # Add to history
-    notes = db_manager.fetch_page_notes(doc_id)
-    note = next((note for note in notes if note.page_number == int(page_number)), None)
-    
-    # Fix: retrieve values from data dictionary
-    user_input = data.get("user_input", "")
-    output = data.get("output", "")
-    complete = bool(data.get("complete", False))
-    tags = data.get("tags", "")
-
-    db_manager.add_page_entry(
-        doc_id,
-        int(page_number),
-        data.get("author", ""),
-        user_input,
-        output,
-        complete,
-        bool(note.ignored) if note else False,
-        tags,
-        attachment_path
-    )
-    
-    # Fix: get actual count
-    entries_count = db_manager.get_entry_count(doc_id, int(page_number))
+        note = db_manager.get_page_note(doc_id, page_number)
+
+        # Fix: retrieve values from data dictionary
+        user_input = data.get("user_input", "")
+        output = data.get("output", "")
+        complete = bool(data.get("complete", False))
+        tags = data.get("tags", "")
+
+        db_manager.add_page_entry(
+            doc_id,
+            page_number,
+            data.get("author", ""),
+            user_input,
+            output,
+            complete,
+            bool(note.ignored) if note else False,
+            tags,
+            attachment_path
+        )
+
+        # Fix: get actual count
+        entries_count = db_manager.get_entry_count(doc_id, page_number)
     return jsonify({"entry_count": entries_count})
 
 
-@app.route("/api/ignore", methods=["POST"])
+@bp.route("/api/ignore", methods=["POST"])
 def toggle_ignore() -> Any:
     payload = request.get_json(force=True)
     doc_id = payload.get("doc_id")
@@ -354,12 +828,20 @@ def toggle_ignore() -> Any:
 
     if not doc_id or not page_number:
         return jsonify({"error": "doc_id and page_number are required."}), 400
+    doc = db_manager.get_document(doc_id)
+    if not doc:
+        abort(404)
+    page_number = _parse_page_number(page_number, doc)
+    if page_number is None:
+        return jsonify({"error": "page_number must be a page of the document."}), 400
 
-    db_manager.set_page_ignored(doc_id, page_number, ignored)
+    with db_manager.transaction():
+        _require_live_document(doc_id)
+        db_manager.set_page_ignored(doc_id, page_number, ignored)
     return jsonify({"ignored": ignored})
 
 
-@app.route("/api/skip", methods=["POST"])
+@bp.route("/api/skip", methods=["POST"])
 def toggle_skip() -> Any:
     payload = request.get_json(force=True)
     doc_id = payload.get("doc_id")
@@ -368,27 +850,179 @@ def toggle_skip() -> Any:
 
     if not doc_id or not page_number:
         return jsonify({"error": "doc_id and page_number are required."}), 400
+    doc = db_manager.get_document(doc_id)
+    if not doc:
+        abort(404)
+    page_number = _parse_page_number(page_number, doc)
+    if page_number is None:
+        return jsonify({"error": "page_number must be a page of the document."}), 400
 
-    db_manager.set_page_skipped(doc_id, page_number, skipped)
+    with db_manager.transaction():
+        _require_live_document(doc_id)
+        db_manager.set_page_skipped(doc_id, page_number, skipped)
     return jsonify({"skipped": skipped})
 
 
-@app.route("/api/resume/<doc_id>", methods=["GET"])
-def resume(doc_id: str) -> Any:
-    page = db_manager.get_first_incomplete(doc_id)
-    if not page:
-        return jsonify({"page_number": None})
-    return jsonify({"page_number": page.page_number})
+@bp.route("/api/tags/<doc_id>", methods=["GET"])
+def list_tags(doc_id: str) -> Any:
+    """Tag cloud for a document: each tag with how many notes and entries carry it."""
+    doc = db_manager.get_document(doc_id)
+    if not doc:
+        abort(404)
+    counts = db_manager.tag_counts(doc_id)
+    return jsonify({"tags": [{"name": name, "count": count} for name, count in counts]})
 
 
-@app.route("/pages/<doc_id>/<int:page_number>", methods=["GET"])
-def serve_page_pdf(doc_id: str, page_number: int) -> Any:
+@bp.route("/api/tags/<doc_id>/pages", methods=["GET"])
+def pages_with_tag(doc_id: str) -> Any:
+    """Pages whose current note or saved entries carry ``?tag=``.
+
+    ``?kind=note`` or ``?kind=entry`` restricts the match to one of them.
+    """
     doc = db_manager.get_document(doc_id)
     if not doc:
         abort(404)
+    tag = request.args.get("tag", "").strip()
+    if not tag:
+        return jsonify({"error": "tag is required."}), 400
+    kind = request.args.get("kind")
+    if kind not in (None, "note", "entry"):
+        return jsonify({"error": "kind must be note or entry."}), 400
+    kinds = (kind,) if kind else ("note", "entry")
+    return jsonify({"tag": tag, "pages": db_manager.pages_with_tag(doc_id, tag, kinds)})
+
+
+@bp.route("/api/search", methods=["GET"])
+def search() -> Any:
+    """Ranked full-text search over page notes, page entries and general entries.
+
+    ``q`` is required; ``doc_id`` narrows to one document, ``kind`` to a
+    comma-separated subset of note/entry/general. Results page with
+    ``limit``/``offset`` and matched terms come back wrapped in ``<mark>``.
+    """
+    if not db_manager.search_available:
+        return jsonify({"error": "This SQLite build has no FTS5 support."}), 501
+    query = request.args.get("q", "").strip()
+    if not query:
+        return jsonify({"error": "q is required."}), 400
+    kinds = [kind for kind in request.args.get("kind", "").split(",") if kind] or SEARCH_KINDS
+    unknown = set(kinds) - set(SEARCH_KINDS)
+    if unknown:
+        return jsonify({"error": f"Unknown kind: {', '.join(sorted(unknown))}"}), 400
+    limit = max(1, min(MAX_SEARCH_RESULTS, request.args.get("limit", 20, type=int)))
+    offset = max(0, request.args.get("offset", 0, type=int))
+
+    # One extra row tells us whether another page exists.
+    hits = db_manager.search(
+        query,
+        doc_id=request.args.get("doc_id") or None,
+        kinds=kinds,
+        limit=limit + 1,
+        offset=offset,
+    )
+    return jsonify(
+        {
+            "query": query,
+            "results": [_search_payload(hit) for hit in hits[:limit]],
+            "next_offset": offset + limit if len(hits) > limit else None,
+        }
+    )
+
+
+@bp.route("/api/cache/stats", methods=["GET"])
+def cache_stats() -> Any:
+    return jsonify({"db": db_manager.cache_stats()})
+
 
-    split_dir = SPLIT_ROOT / doc_id
-    filename = f"page_{page_number:03}.pdf"
-    if not (split_dir / filename).exists():
+@bp.route("/api/resume/<doc_id>", methods=["GET"])
+def resume(doc_id: str) -> Any:
+    doc = db_manager.get_document(doc_id)
+    if not doc:
+        abort(404)
+    return jsonify({"page_number": db_manager.get_page_status(doc_id).first_pending()})
+
+
+def _resolve_page_file(doc_id: str, page_number: int) -> Tuple[Path, Optional[Document]]:
+    """Locate a split page, extracting it on demand; aborts with 404 if impossible.
+
+    A document's pages live under its content hash, or under its doc_id if
+    it predates the blob store. ``split_root/<doc_id>`` is either that folder
+    or a link to the blob's, and deleting the document removes it along with
+    writing the tombstone, so a page found there is served without touching
+    the database. Otherwise the document row says where to look, and the
+    link is recreated once the database confirms the document is live. The document is returned when it was loaded.
+    """
+    split_root = str(current_app.config["SPLIT_FOLDER"])
+    page_path = safe_join(split_root, doc_id, page_filename(page_number))
+    if page_path is None:
+        abort(404)
+    if os.path.exists(page_path):
+        # Through the link to the blob's folder, which keys thumbnails and ETags.
+        return Path(os.path.realpath(page_path)), None
+
+    doc = db_manager.get_document(doc_id)
+    # The row may come from the read cache; a link recreated for a document
+    # deleted meanwhile would serve its pages to every process from disk.
+    if not doc or not db_manager.document_is_live(doc_id):
+        abort(404)
+    if doc.content_hash:
+        blob_store.link_document(doc_id, doc.content_hash)
+    page_path = safe_join(split_root, doc.content_hash or doc_id, page_filename(page_number))
+    if page_path is None:
         abort(404)
-    return send_from_directory(split_dir, filename, as_attachment=False)
+    page_file = Path(page_path)
+    if not page_file.exists():
+        # Lazy documents (or lost splits) are extracted from the source on demand.
+        source = Path(doc.source_path)
+        if not source.exists() or not page_extractor.extract(source, page_file.parent, page_number):
+            abort(404)
+    return page_file, doc
+
+
+def _send_immutable(path: Path, mimetype: str) -> Response:
+    """Send a never-changing file with a content ETag, ranges and long-lived caching."""
+    stat = path.stat()
+    response = send_file(
+        path,
+        mimetype=mimetype,
+        etag=_file_digest(str(path), stat.st_mtime_ns, stat.st_size),
+        last_modified=stat.st_mtime,
+        max_age=PAGE_MAX_AGE,
+        conditional=True,
+    )
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+@bp.route("/pages/<doc_id>/<int:page_number>", methods=["GET"])
+def serve_page_pdf(doc_id: str, page_number: int) -> Any:
+    page_file, doc = _resolve_page_file(doc_id, page_number)
+    response = _send_immutable(page_file, "application/pdf")
+
+    split_dir = page_file.parent
+    if _state().lazy_splits and page_extractor.needs_prefetch(split_dir, page_number):
+        doc = doc or db_manager.get_document(doc_id)
+        if doc:
+            page_extractor.prefetch(Path(doc.source_path), split_dir, page_number)
+    return response
+
+
+@bp.route("/thumbs/<doc_id>/<int:page_number>.png", methods=["GET"])
+def serve_page_thumbnail(doc_id: str, page_number: int) -> Any:
+    # Checked first: resolving the page would extract it in lazy mode for nothing.
+    if available_renderer() is None:
+        return jsonify({"error": "No PDF renderer available; install pypdfium2 or poppler-utils."}), 501
+    page_file, _ = _resolve_page_file(doc_id, page_number)
+    try:
+        # Keyed like the split folder, so documents sharing a blob share thumbnails.
+        thumb = thumbnail_cache.get(
+            page_file.parent.name, page_number, page_file, request.args.get("width", type=int)
+        )
+    except RuntimeError as exc:
+        return jsonify({"error": str(exc)}), 501
+    return _send_immutable(thumb, "image/png")
+
+
+# For main.py and WSGI servers; creating it has no side effects.
+app = create_app()